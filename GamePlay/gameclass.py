@@ -3,6 +3,17 @@ from __future__ import division
 
 import pygame
 import pygame.locals as loc
+import pymunk
+
+from Physics.pipeline import PhysicsPipeline, take_snapshot
+from Physics.timestep import FixedTimestep, MAX_STEPS
+from Physics import substepping
+from Tools.profiling import game_timer
+from Sound import sound_effects
+
+# How far outside the camera's view, in world units, objects are still
+# updated and drawn. Should be at least as big as the largest sprite.
+CULL_MARGIN = 100
 
 
 class Game:
@@ -27,6 +38,38 @@ class Game:
         self._fps = None
         # TODO: Add option for more sprite groups when needed
         self._sprite_group = None
+        # The drawing order of the sprites, and the ones that were
+        # in or close to the camera's view this frame
+        self._sprite_order = {}
+        self._visible_sprites = None
+        self._cull_margin = CULL_MARGIN
+        # Whether the physics should run on a separate thread,
+        # and the pipeline that runs it
+        self._pipelined = False
+        self._pipeline = None
+        # Whether or not to wait to keep the fps
+        self._limit_fps = True
+        # Whether the physics should be stepped with a fixed timestep,
+        # the scheduler that decides how many steps to run each frame,
+        # and the state before the last step and how far past it
+        # the current time is, for interpolating when drawing
+        self._fixed_timestep = False
+        self._max_steps = MAX_STEPS
+        self._timestep = None
+        self._previous_state = None
+        self._alpha = 1.0
+        # A jump pressed in a frame in which no physics step was run,
+        # kept for the next step
+        self._pending_jump = False
+        # Settings for splitting fast steps into substeps, the size of the
+        # thinnest shape (found when first needed) and the number of
+        # substeps in the last step
+        self._max_substeps = substepping.MAX_SUBSTEPS
+        self._substep_fraction = substepping.SUBSTEP_FRACTION
+        self._feature_size = None
+        self._substeps = 1
+        # The collisions recorded during physics steps
+        self._collision_events = None
 
     @classmethod
     def take_menu_input(cls):
@@ -99,6 +142,12 @@ class Game:
         current_events = pygame.event.get()
         player_keys = self._player.get_keys()
 
+        # If no input has been taken before (e.g. if the level was started
+        # without going through a menu), nothing was pressed last frame
+        if self.__class__._keys_pressed_last_frame is None:
+            self.__class__._keys_pressed_last_frame = \
+                [False] * len(self.__class__._keys_pressed)
+
         # --- Handle non-keyboard events ---
 
         # Check if the user attempts to close the window,
@@ -128,11 +177,29 @@ class Game:
         else:
             jump = False
 
+        # Zoom the camera one zoom level per key press
+        if self._key_pressed_now(loc.K_PLUS, loc.K_EQUALS, loc.K_KP_PLUS):
+            self._camera.zoom_in()
+        if self._key_pressed_now(loc.K_MINUS, loc.K_KP_MINUS):
+            self._camera.zoom_out()
+
         # Save the keys that have been pressed this frame
         self.__class__._keys_pressed_last_frame = self.__class__._keys_pressed
 
         return direction, jump, open_pop_up
 
+    def _key_pressed_now(self, *keys):
+        '''
+        Returns whether or not any of keys was pressed this frame,
+        but not last frame.
+        '''
+
+        for key in keys:
+            if self.__class__._keys_pressed[key] and \
+                    not self.__class__._keys_pressed_last_frame[key]:
+                return True
+        return False
+
     def game_loop(self):
         '''
         The game loop - handles everything that should happen
@@ -147,32 +214,279 @@ class Game:
         # NOTE: The game logic that is to be added perhaps belongs
         #       in the collision callbacks and the update-calls instead?
 
+        game_timer.begin_frame()
+
         # Take input
         direction, jump, open_pop_up = self.take_game_input()
+        game_timer.mark('input')
 
-        # Move the player according to input
-        self._player.move(direction, jump)
+        if self._pipelined:
+            self._pipelined_frame(direction, jump)
+        elif self._fixed_timestep:
+            self._fixed_timestep_frame(direction, jump)
+        else:
+            # Move the player according to input
+            self._player.move(direction, jump)
 
-        # Update all sprites
-        self._sprite_group.update(self)
+            # Update the sprites that can be seen by the camera
+            for sprite in self.find_visible_sprites():
+                sprite.update(self)
+            game_timer.mark('update')
 
-        # Update the world's physics
-        self._space.step(1 / self._fps)
+            # Update the world's physics
+            self._step_physics()
+            game_timer.mark('physics')
 
-        # Update the camera
-        self._camera.update(self)
+            # Update the camera
+            self._camera.update(self)
+            game_timer.mark('camera')
+
+        # Play the sound effects triggered this frame, and start music
+        # that has finished loading
+        sound_effects.effects.update()
+        pygame.music_player.update()
+        game_timer.mark('sound')
 
         # Keep the desired fps
-        self._clock.tick(self._fps)
+        if self._limit_fps:
+            self._clock.tick(self._fps)
+        else:
+            self._clock.tick()
+        game_timer.mark('tick')
+        game_timer.end_frame()
 
         return open_pop_up
 
+    def _pipelined_frame(self, direction, jump):
+        '''
+        Runs the sprite update, physics and drawing of one frame with the
+        physics on a separate thread. The sprites are drawn from the
+        snapshot of the previous step while the next step is computed.
+
+        Input:
+            * direction: Int
+                - The direction in which the player should be moving.
+            * jump: Bool
+                - Whether or not the player should jump.
+        '''
+
+        if self._pipeline is None:
+            self._pipeline = PhysicsPipeline(
+                self._step_physics,
+                self._moving_objects + [self._player.get_object()])
+            self._pipeline.start()
+
+        # The space may only be used while the physics thread is idle,
+        # so find the visible sprites before starting the step
+        visible = self.find_visible_sprites()
+
+        # Moving the player applies impulses, so it's done
+        # on the physics thread
+        player = self._player
+        self._pipeline.begin_frame([lambda: player.move(direction, jump)])
+
+        for sprite in visible:
+            sprite.update(self)
+        game_timer.mark('update')
+        self._camera.update(self)
+        game_timer.mark('camera')
+
+        # The time spent waiting for the physics thread
+        self._pipeline.end_frame()
+        game_timer.mark('physics')
+
+    def _fixed_timestep_frame(self, direction, jump):
+        '''
+        Runs the physics steps, sprite update and drawing of one frame with
+        a fixed timestep: as many physics steps are run as fit in the time
+        that has passed, and the sprites are drawn between the last two
+        physics states. Drawing is skipped when the physics is behind.
+
+        Input:
+            * direction: Int
+                - The direction in which the player should be moving.
+            * jump: Bool
+                - Whether or not the player should jump.
+        '''
+
+        if self._timestep is None:
+            self._timestep = FixedTimestep(1 / self._fps, self._max_steps)
+
+        if self._limit_fps:
+            steps = self._timestep.advance()
+        else:
+            # Run as fast as possible, but exactly one step per frame,
+            # so that the result doesn't depend on the speed of the machine
+            steps = self._timestep.advance(1 / self._fps)
+
+        # A jump is only applied once, in the next step that is run
+        self._pending_jump = self._pending_jump or jump
+
+        visible = self.find_visible_sprites()
+
+        # Update the world's physics, moving the player according to
+        # input before each step so that it accelerates the same
+        # whatever the frame rate
+        for step in range(steps):
+            self._player.move(direction, self._pending_jump)
+            self._pending_jump = False
+            if step == steps - 1:
+                # Remember the state before the last step,
+                # to interpolate from when drawing
+                self._previous_state = take_snapshot(visible)
+            self._step_physics()
+        self._alpha = self._timestep.get_alpha()
+        game_timer.mark('physics')
+
+        if not self._timestep.should_draw():
+            return
+
+        # Update the sprites that can be seen by the camera
+        for sprite in visible:
+            sprite.update(self)
+        game_timer.mark('update')
+
+        # Update the camera
+        self._camera.update(self)
+        game_timer.mark('camera')
+
+    def _step_physics(self):
+        '''
+        Steps the world's physics one frame. If any body is fast enough
+        to move past the thinnest shape in the world within the step,
+        the step is split into smaller substeps.
+        '''
+
+        dt = 1 / self._fps
+
+        if self._feature_size is None:
+            self._feature_size = \
+                substepping.min_feature_size(self._space.shapes)
+
+        bodies = [obj.get_body() for obj in self._moving_objects]
+        bodies.append(self._player.get_object().get_body())
+        substeps = substepping.count_substeps(
+            bodies, dt, self._feature_size,
+            self._substep_fraction, self._max_substeps)
+        self._substeps = substeps
+
+        collisions = self._collision_events
+        for substep in range(substeps):
+            self._space.step(dt / substeps)
+            if collisions is not None:
+                collisions.collect_impulses()
+
+        # Let the game react to all collisions of the step at once
+        if collisions is not None:
+            collisions.dispatch()
+
+    def get_object_state(self, obj):
+        '''
+        Returns the position and angle that obj should be drawn at, and
+        whether or not its body is sleeping. When the physics runs on a
+        separate thread, this is the state from the last finished step
+        rather than the state of the body.
+
+        Input:
+            * obj: shapes.Shape
+                - The object to get the state of.
+        Output:
+            * position: 2-tuple of floats
+                - The position of the object in world coordinates.
+            * angle: Float
+                - The angle of the object in radians.
+            * sleeping: Bool
+                - Whether or not the body of the object is sleeping.
+        '''
+
+        if self._pipeline is not None:
+            state = self._pipeline.get_snapshot().get(obj)
+            if state is not None:
+                return state
+
+        body = obj.get_body()
+        position = body.position
+
+        if self._previous_state is not None:
+            previous = self._previous_state.get(obj)
+            if previous is not None:
+                # Interpolate between the states before and
+                # after the last physics step
+                (x, y), angle, sleeping = previous
+                alpha = self._alpha
+                return ((x + (position[0] - x) * alpha,
+                         y + (position[1] - y) * alpha),
+                        angle + (body.angle - angle) * alpha,
+                        body.is_sleeping)
+
+        return position, body.angle, body.is_sleeping
+
+    def reset_timestep(self):
+        '''
+        Forgets the time that has passed since the last frame, e.g. after
+        a pop-up menu has been open, so the physics doesn't try to catch up.
+        '''
+
+        if self._timestep is not None:
+            self._timestep.reset()
+        self._pending_jump = False
+
+    def stop_physics_thread(self):
+        '''
+        Stops the physics thread, if it is running. It is started again
+        the next time a frame is run.
+        '''
+
+        if self._pipeline is not None:
+            self._pipeline.stop()
+            self._pipeline = None
+
+    def find_visible_sprites(self):
+        '''
+        Finds the sprites of all objects that are in or close to the
+        camera's view, by querying the physics space's spatial index.
+        The result is stored, and can later be retrieved with
+        get_visible_sprites().
+
+        Output:
+            * visible: List of shapes.MovingShape
+                - The visible sprites, in drawing order.
+        '''
+
+        left, bottom, right, top = \
+            self._camera.get_view_bounds(self._cull_margin)
+        shapes = self._space.bb_query(pymunk.BB(left, bottom, right, top))
+
+        visible = set()
+        for shape in shapes:
+            # Static shapes have no sprites
+            obj = getattr(shape, 'obj', None)
+            if obj in self._sprite_order:
+                visible.add(obj)
+
+        # The camera follows the player, so it must always be updated
+        visible.add(self._player.get_object())
+
+        self._visible_sprites = sorted(visible, key=self._sprite_order.get)
+        return self._visible_sprites
+
+    def get_visible_sprites(self):
+        '''
+        Returns the sprites found by the last call to find_visible_sprites(),
+        or all sprites if it hasn't been called yet.
+        '''
+
+        if self._visible_sprites is None:
+            return self._sprite_group.sprites()
+        return self._visible_sprites
+
     def redraw(self):
         '''
         Clears the screen, redraws the background and sets all sprites to dirty
         '''
 
         # TODO: Remove this function and use camera.update() directly instead
+        self._camera.force_redraw()
         self._camera.update(self)
 
     # Getters/setters
@@ -206,10 +520,66 @@ class Game:
 
     def set_background(self, background):
         self._background = background
+        self._background.set_static_objects(self._static_objects)
 
     def get_fps(self):
         return self._fps
 
+    def get_limit_fps(self):
+        return self._limit_fps
+
+    def set_limit_fps(self, limit_fps):
+        self._limit_fps = limit_fps
+
+    def get_pipelined(self):
+        return self._pipelined
+
+    def set_pipelined(self, pipelined):
+        if not pipelined:
+            self.stop_physics_thread()
+        self._pipelined = pipelined
+
+    def get_fixed_timestep(self):
+        return self._fixed_timestep
+
+    def set_fixed_timestep(self, fixed_timestep):
+        self._fixed_timestep = fixed_timestep
+        self._timestep = None
+        self._previous_state = None
+
+    def get_max_steps(self):
+        return self._max_steps
+
+    def set_max_steps(self, max_steps):
+        self._max_steps = max_steps
+        if self._timestep is not None:
+            self._timestep.set_max_steps(max_steps)
+
+    def get_timestep(self):
+        return self._timestep
+
+    def get_collision_events(self):
+        return self._collision_events
+
+    def set_collision_events(self, collision_events):
+        self._collision_events = collision_events
+
+    def get_max_substeps(self):
+        return self._max_substeps
+
+    def set_max_substeps(self, max_substeps):
+        self._max_substeps = max_substeps
+
+    def get_substep_fraction(self):
+        return self._substep_fraction
+
+    def set_substep_fraction(self, fraction):
+        self._substep_fraction = fraction
+
+    def get_substeps(self):
+        # The number of substeps the last physics step was split into
+        return self._substeps
+
     def set_fps(self, fps):
         self._fps = fps
 
@@ -218,15 +588,29 @@ class Game:
 
     def set_sprite_group(self, sprite_group):
         self._sprite_group = sprite_group
+        self._sprite_order = dict((sprite, index) for index, sprite
+                                  in enumerate(sprite_group))
+        self._visible_sprites = None
+
+    def get_cull_margin(self):
+        return self._cull_margin
+
+    def set_cull_margin(self, margin):
+        self._cull_margin = margin
 
     def add_moving_objects(self, *objects):
         self._moving_objects.extend(objects)
+        self._feature_size = None
 
     def get_moving_objects(self):
         return self._moving_objects
 
     def add_static_objects(self, *objects):
         self._static_objects.extend(objects)
+        self._feature_size = None
+        # Visible static objects are drawn onto the background
+        if self._background is not None:
+            self._background.set_static_objects(self._static_objects)
 
     def get_static_objects(self):
         return self._static_objects
@@ -6,19 +6,33 @@ from Tools import load_yaml
 from UI import menus
 
 
-def run_level(file_path):
+def run_level(file_path, frames=None, limit_fps=True):
     '''
     The main function of the game - loads a level and runs it.
 
     Input:
         * file_path: String
             - The name of the YAML-file describing the level.
+        * frames: Int
+            - The number of frames to run before returning.
+              If None, the level runs until it is left via a menu.
+            - Default: None
+        * limit_fps: Bool
+            - Whether or not the game should wait to keep its fps.
+              Turning it off is mostly useful for benchmarks.
+            - Default: True
+    Output:
+        * game: gameclass.Game
+            - The Game object of the level, if frames was given.
     '''
 
     # Load the level
     game = load_yaml.load_level(file_path)
+    game.set_limit_fps(limit_fps)
 
-    while True:
+    frame = 0
+    while frames is None or frame < frames:
+        frame += 1
 
         # Run one iteration of the game.
         open_pop_up = game.game_loop()
@@ -26,9 +40,16 @@ def run_level(file_path):
         # Open a pop-up menu if told to do so.
         if open_pop_up:
             # The loop can be terminated from within run_pop_up_menu()
-            # by e.g. loading another level/menu/closing the application.
+            # by e.g. loading another level/menu/closing the application,
+            # so stop the physics thread (if any) before opening it.
+            game.stop_physics_thread()
             menus.run_pop_up_menu('quit_level_pop_up.yaml')
             # Force all items to be redrawn to erase the pop-up menu
             # and set the mouse to invisible
             game.redraw()
             pygame.mouse.set_visible(False)
+            # Don't try to catch up with the time the menu was open
+            game.reset_timestep()
+
+    game.stop_physics_thread()
+    return game
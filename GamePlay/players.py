@@ -55,15 +55,15 @@ class Player(shapes.MovingShape):
 
         self._object = obj
         self._object.get_shape().collision_type = self.collision_type
-        # A hack to be able to access the player via the shape
-        self._object.get_shape().__setattr__('player', self)
 
         # Game properties
         # TODO: Set these via settings file
         self._keys = {'left': loc.K_a,
                       'right': loc.K_d,
                       'jump': loc.K_SPACE}
-        self._jumping = False
+        # The objects the player is standing on, kept up to date by
+        # the collision callbacks when contacts begin and end
+        self._ground_contacts = set()
 
         self._move_impulse = move_impulse
         self._jump_impulse = jump_impulse
@@ -73,10 +73,12 @@ class Player(shapes.MovingShape):
         self._jump_sound_vol = jump_sound_vol
         self._bounce_sound_vol = bounce_sound_vol
 
-        self._jump_sound = sound_effects.load_sound(jump_sound_file)
-        self._jump_sound.set_volume(jump_sound_vol)
-        self._bounce_sound = sound_effects.load_sound(bounce_sound_file)
-        self._bounce_sound.set_volume(bounce_sound_vol)
+        # NOTE: The sounds are shared with other players and
+        #       loaded only the first time they are used.
+        self._jump_sound = sound_effects.bank.get_handle(jump_sound_file,
+                                                         jump_sound_vol)
+        self._bounce_sound = sound_effects.bank.get_handle(bounce_sound_file,
+                                                           bounce_sound_vol)
 
     @classmethod
     def from_yaml(cls, loader, node):
@@ -144,24 +146,44 @@ class Player(shapes.MovingShape):
 
     def jump(self):
         '''
-        Makes the player jump if it is not already jumping.
+        Makes the player jump if it is standing on something.
         '''
 
-        if not self._jumping:
+        # NOTE: A contact that began against the side of an object and
+        #       then rolled onto its top isn't among the ground contacts,
+        #       so the current contacts are checked as well. This runs
+        #       between physics steps, also in pipelined mode.
+        body = self._object.get_body()
+        if self._ground_contacts or col_call.touches_ground(body):
             self._jump_sound.play()
             self._object._body.apply_impulse((0, self._jump_impulse))
-            self._jumping = True
+
+    def add_ground_contact(self, obj):
+        '''
+        Records that the player has started standing on obj.
+        '''
+
+        self._ground_contacts.add(obj)
+
+    def remove_ground_contact(self, obj):
+        '''
+        Records that the player is no longer touching obj.
+        Does nothing if the player wasn't standing on it.
+        '''
+
+        self._ground_contacts.discard(obj)
 
     def play_bounce(self, level):
         '''
-        Plays the players bounce sound.
+        Plays the players bounce sound. Bounces close together in time
+        are played as one, at the highest level.
 
         Input:
             * level: Float
-                - The volume that the sound should be played at.
+                - The volume that the sound should be played at,
+                  relative to the bounce sound's volume.
         '''
-        self._bounce_sound.set_volume(level)
-        self._bounce_sound.play()
+        self._bounce_sound.play(level)
 
     # Getters/setters
 
@@ -172,7 +194,8 @@ class Player(shapes.MovingShape):
         return self._keys
 
     def get_jumping(self):
-        return self._jumping
+        # The player is in the air if it isn't standing on anything
+        return not self._ground_contacts
 
-    def set_jumping(self, jumping):
-        self._jumping = jumping
+    def get_ground_contacts(self):
+        return len(self._ground_contacts)
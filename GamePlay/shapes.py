@@ -10,6 +10,7 @@ import yaml
 
 from Physics import collision_callbacks as col_call
 from Graphics import view
+from Graphics.transform_cache import rotation_cache
 
 # TODO: Add properties such as friction and elasticity to the
 # constructors instead of hard-coding.
@@ -87,7 +88,7 @@ class StaticShape(Shape):
     # The collision type for static objects
     collision_type = col_call.STATIC_TYPE
 
-    def __init__(self, friction=1.0, elasticity=0.5):
+    def __init__(self, friction=1.0, elasticity=0.5, color=None):
         '''
         Base constructor for all static shapes in the game.
 
@@ -102,6 +103,10 @@ class StaticShape(Shape):
                   0.0 -> completely plastic collision -> no bounce.
                   1.0 -> completely elastic collision -> perfect bounce.
                 - Default: 0.5
+            * color: 3-tuple of ints 0-255
+                - The color of the shape in rgb.
+                  If set to None, the shape is invisible.
+                - Default: None
         '''
         Shape.__init__(self)
 
@@ -110,6 +115,46 @@ class StaticShape(Shape):
         self._friction = friction
         self._elasticity = elasticity
 
+        # Pygame properties
+        self._color = color
+
+    # NOTE: Static shapes are not sprites that are drawn every frame.
+    #       Instead they are drawn once onto the level background
+    #       (see backgrounds.TiledBackground.set_static_objects).
+
+    def get_draw_rect(self, height):
+        '''
+        Returns the area that the shape covers when drawn on a
+        background of the given height, or None if it isn't visible.
+        Should be overridden by visible static shapes.
+
+        Input:
+            * height: Int
+                - The height of the background, i.e. of the world.
+        Output:
+            * rect: pygame.Rect
+                - The area covered by the shape in background pixels.
+        '''
+
+        return None
+
+    def draw(self, surface, offset, height):
+        '''
+        Draws the shape onto a part of the background.
+        Should be overridden by visible static shapes.
+
+        Input:
+            * surface: pygame.Surface
+                - The Surface to draw on.
+            * offset: 2-tuple of ints
+                - The position of the upper left corner of surface
+                  relative to the upper left corner of the background.
+            * height: Int
+                - The height of the background, i.e. of the world.
+        '''
+
+        pass
+
 
 class MovingShape(Shape):
     '''
@@ -127,6 +172,8 @@ class MovingShape(Shape):
         '''
 
         Shape.__init__(self)
+        # The camera scale the current image was made for
+        self._drawn_scale = None
 
     def update(self, game):
         '''
@@ -141,21 +188,44 @@ class MovingShape(Shape):
         # are not initialized; Make sure all classes that inherit from this
         # class initializes all variables correctly
 
-        # Rotate and scale the image
-        self.image = pygame.transform.rotozoom(self._baseimage,
-                                               self._body.angle*180/pi, 1)
-        self.rect = self.image.get_rect()
-
-        # Move the image to the right position
-        self.rect.center = game.get_camera().world_to_screen_coords(
-            self._body.position[0], self._body.position[1])
-
-        # TODO: Try to make this smarter; only set
-        #       dirty to 1 if it has actually moved.
-        self.dirty = 1
+        camera = game.get_camera()
+        scale = camera.get_scale()
+
+        # NOTE: The state is read through the game, since the body may be
+        #       being stepped on the physics thread.
+        position, angle, sleeping = game.get_object_state(self)
+
+        # A sleeping body hasn't moved since it fell asleep, so its image is
+        # still right; only its position on the screen may have changed
+        # (if the camera has moved while it wasn't visible).
+        if sleeping and scale == self._drawn_scale:
+            center = camera.world_to_screen_coords(position[0], position[1])
+            if center != self.rect.center:
+                self.rect = self.image.get_rect(center=center)
+                self.dirty = 1
+            return
+
+        # Rotate and scale the image. The transformed images are cached and
+        # shared between all sprites with the same base image, so this is
+        # usually a lookup.
+        image = rotation_cache.get_rotated(self._baseimage, angle*180/pi,
+                                           scale)
+        self._drawn_scale = scale
+
+        # Find the right position of the image on the screen
+        center = camera.world_to_screen_coords(position[0], position[1])
+
+        # Only mark the sprite as dirty if it has actually changed,
+        # so the camera can skip redrawing sprites that stand still.
+        if image is not self.image or center != self.rect.center:
+            self.image = image
+            self.rect = image.get_rect(center=center)
+            self.dirty = 1
 
     def set_pos(self, pos):
         self._body.position = pos
+        # Moving a sleeping body doesn't wake it up by itself
+        self._body.activate()
 
 
 class Rectangle(MovingShape):
@@ -393,7 +463,7 @@ class Boundary(StaticShape):
     yaml_tag = '!Boundary'
 
     def __init__(self, points=[(0, 0), (1, 1)], width=5.0,
-                 friction=1.0, elasticity=0.8):
+                 friction=1.0, elasticity=0.8, color=None):
         '''
         Constructor for Boundary.
 
@@ -408,6 +478,9 @@ class Boundary(StaticShape):
                   that nothing passes through by accident, but thin
                   enough that strange effects like that it seems like
                   objects are "hovering" start occuring.
+                  Fast objects are kept from passing through thin
+                  boundaries by splitting the physics steps
+                  (see Physics/substepping.py).
                 - Default: 5.0
             * friction: Float 0.0 - inf
                 - The friction coefficient of the boundary (the mu-factor).
@@ -419,9 +492,14 @@ class Boundary(StaticShape):
                   0.0 -> completely plastic collision -> no bounce.
                   1.0 -> completely elastic collision -> perfect bounce.
                 - Default: 0.5
+            * color: 3-tuple of ints 0-255
+                - The color of the boundary in rgb.
+                  If set to None, the boundary is invisible.
+                - Default: None
         '''
 
-        StaticShape.__init__(self, friction=friction, elasticity=elasticity)
+        StaticShape.__init__(self, friction=friction, elasticity=elasticity,
+                             color=color)
 
         self._shape = pymunk.Segment(self._body, points[0], points[1], width)
 
@@ -447,10 +525,11 @@ class Boundary(StaticShape):
         width = values['width']
         friction = values['friction']
         elasticity = values['elasticity']
+        color = values.get('color')
 
         # Return an instance of the object
         return cls(points=points, width=width,
-                   friction=friction, elasticity=elasticity)
+                   friction=friction, elasticity=elasticity, color=color)
 
     @classmethod
     def to_yaml(cls, dumper, instance):
@@ -464,8 +543,161 @@ class Boundary(StaticShape):
         mapping = {'points': instance._points,
                    'width': instance._width,
                    'friction': instance._friction,
-                   'elasticity': instance._elasticity}
+                   'elasticity': instance._elasticity,
+                   'color': instance._color}
+
+        # Use YAMLs default representation, but with the custom YAML-tag
+        # and using only the properties in out custom mapping
+        return dumper.represent_mapping(cls.yaml_tag, mapping)
+
+    def get_draw_rect(self, height):
+        if self._color is None:
+            return None
+
+        # The segment's width is its radius; pad with it on all sides
+        (x1, y1), (x2, y2) = self._points
+        pad = int(self._width) + 1
+        rect = pygame.Rect(min(x1, x2), height - max(y1, y2),
+                           abs(x2 - x1), abs(y2 - y1))
+        return rect.inflate(2 * pad, 2 * pad)
+
+    def draw(self, surface, offset, height):
+        if self._color is None:
+            return
+
+        start, end = [(int(x - offset[0]), int(height - y - offset[1]))
+                      for x, y in self._points]
+        pygame.draw.line(surface, self._color, start, end,
+                         max(1, int(2 * self._width)))
+
+
+class Platform(StaticShape):
+    '''
+    A class for static rectangles, such as platforms and walls.
+    '''
+
+    yaml_tag = '!Platform'
+
+    def __init__(self, width=100, height=20, pos=(100, 100),
+                 friction=1.0, elasticity=0.5,
+                 color=(0, 0, 0), image_file=None):
+        '''
+        Constructor for Platform.
+
+        Input:
+            * width: Int
+                - The width of the platform.
+                - Default: 100
+            * height: Int
+                - The height of the platform.
+                - Default: 20
+            * pos: 2-tuple of ints
+                - The position of the center of the platform.
+                - Default: (100, 100)
+            * friction: Float 0.0 - inf
+                - The friction coefficient of the platform (the mu-factor).
+                  Higher value -> more friction.
+                - Default: 1.0
+            * elasticity: Float 0.0 - 1.0
+                - The elasticity of the platform.
+                  Higher value -> "bouncier" collisions.
+                - Default: 0.5
+            * color: 3-tuple of ints 0-255
+                - The color of the platform in rgb.
+                  If "image_file" is specified, "color" is ignored.
+                  If both are None, the platform is invisible.
+                - Default: (0, 0, 0)
+            * image_file: String
+                - The name of the file containing the image to be used
+                  on the platform.
+                  If set to None, the colour specified in "color"
+                  is used instead.
+                - Default: None
+        '''
+
+        StaticShape.__init__(self, friction=friction, elasticity=elasticity,
+                             color=color)
+
+        self._width = width
+        self._height = height
+        self._pos = pos
+        self._image_file = image_file
+
+        # Pymunk properties
+        # NOTE: The static body is never moved, so the corners are
+        #       given in world coordinates.
+        x, y = pos
+        points = [(x - width/2, y - height/2), (x + width/2, y - height/2),
+                  (x + width/2, y + height/2), (x - width/2, y + height/2)]
+        self._shape = pymunk.Poly(self._body, points)
+        self._shape.friction = self._friction
+        self._shape.elasticity = self._elasticity
+        self._shape.collision_type = self.collision_type
+
+        # Pygame properties
+        if image_file is not None:
+            self._baseimage = view.load_and_scale(image_file, (width, height))
+
+    @classmethod
+    def from_yaml(cls, loader, node):
+        '''
+        A constructor that YAML uses to create instances of this class.
+        '''
+
+        # Create a dict from the YAML code for the object,
+        # containing all its properties
+        values = loader.construct_mapping(node)
+
+        # Extract the needed properties
+        width = values['width']
+        height = values['height']
+        pos = values['pos']
+        friction = values['friction']
+        elasticity = values['elasticity']
+        color = values['color']
+        image_file = values['image']
+
+        # Return an instance of the object
+        return cls(width=width, height=height, pos=pos,
+                   friction=friction, elasticity=elasticity,
+                   color=color, image_file=image_file)
+
+    @classmethod
+    def to_yaml(cls, dumper, instance):
+        '''
+        A method used by YAML to represent an instance of this class.
+        '''
+
+        # Construct a dict containing only the properties (wrong word...)
+        # we want to use in the representation
+
+        mapping = {'width': instance._width,
+                   'height': instance._height,
+                   'pos': instance._pos,
+                   'friction': instance._friction,
+                   'elasticity': instance._elasticity,
+                   'color': instance._color,
+                   'image': instance._image_file}
 
         # Use YAMLs default representation, but with the custom YAML-tag
         # and using only the properties in out custom mapping
         return dumper.represent_mapping(cls.yaml_tag, mapping)
+
+    def get_draw_rect(self, height):
+        if self._baseimage is None and self._color is None:
+            return None
+
+        rect = pygame.Rect(0, 0, self._width, self._height)
+        rect.center = (int(self._pos[0]), int(height - self._pos[1]))
+        return rect
+
+    def draw(self, surface, offset, height):
+        rect = self.get_draw_rect(height)
+        if rect is None:
+            return
+
+        rect.move_ip(-offset[0], -offset[1])
+        if self._baseimage is not None:
+            surface.blit(self._baseimage, rect)
+        else:
+            pygame.draw.rect(surface, self._color, rect)
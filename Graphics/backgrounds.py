@@ -0,0 +1,297 @@
+# Backgrounds for levels, split into tiles so that only the parts
+# of the background that the camera can see have to be drawn.
+# Static scenery is drawn onto the tiles once, instead of every frame.
+
+from __future__ import division
+
+from math import floor, ceil
+
+import pygame
+
+from Tools.caching import SizedLRUCache
+
+# The default width and height of a background tile in pixels.
+TILE_SIZE = 256
+# How many scaled versions of a background are kept at a time.
+SCALED_LEVELS = 4
+
+
+class TiledBackground():
+    '''
+    A background made up of equally sized square tiles. Behaves like a
+    large Surface that can only be drawn, but only ever touches
+    the tiles that overlap the area being drawn.
+    '''
+
+    def __init__(self, size, tile_size=TILE_SIZE):
+        '''
+        Constructor for TiledBackground. Creates an empty background;
+        use from_surface() or from_color() to create one with content.
+
+        Input:
+            * size: 2-tuple of ints
+                - The size of the whole background in pixels.
+            * tile_size: Int
+                - The width and height of each tile in pixels.
+                - Default: TILE_SIZE
+        '''
+
+        self._size = tuple(size)
+        self._tile_size = tile_size
+        self._rect = pygame.Rect((0, 0), self._size)
+        # Maps (column, row) -> pygame.Surface, without and with
+        # the static objects drawn onto them
+        self._plain_tiles = {}
+        self._tiles = {}
+        # The static objects to draw onto the background, whether they
+        # have been drawn yet and a counter for when they change
+        self._static_objects = []
+        self._baked = False
+        self._version = 0
+        # The colour of single-coloured backgrounds, None otherwise
+        self._color = None
+        # Scaled versions of the background, one per zoom level
+        self._scaled = SizedLRUCache(SCALED_LEVELS, lambda background: 1)
+
+    @classmethod
+    def from_surface(cls, surface, tile_size=TILE_SIZE):
+        '''
+        Creates a background by cutting surface into tiles.
+        The tiles are copies, so surface can be thrown away afterwards.
+        '''
+
+        background = cls(surface.get_size(), tile_size)
+        for col, row in background._all_tiles():
+            rect = background._tile_rect(col, row).clip(background._rect)
+            background._plain_tiles[(col, row)] = \
+                surface.subsurface(rect).copy()
+
+        return background
+
+    @classmethod
+    def from_color(cls, color, size, tile_size=TILE_SIZE):
+        '''
+        Creates a background of a single color. All tiles share the
+        same Surface, so it uses the memory of one tile regardless of size.
+
+        Input:
+            * color: 3- or 4-tuple of ints
+                - The colour in rgb[a]. They are all ints 0-255.
+            * size: 2-tuple of ints
+                - The size of the whole background in pixels.
+            * tile_size: Int
+                - The width and height of each tile in pixels.
+                - Default: TILE_SIZE
+        '''
+
+        if len(color) == 4:
+            # Alpha value specified
+            tile = pygame.Surface((tile_size, tile_size), pygame.SRCALPHA)
+        else:
+            # Only RGB specified
+            tile = pygame.Surface((tile_size, tile_size))
+        tile.fill(color)
+
+        background = cls(size, tile_size)
+        background._color = color
+        for col, row in background._all_tiles():
+            background._plain_tiles[(col, row)] = tile
+
+        return background
+
+    def set_static_objects(self, static_objects):
+        '''
+        Sets the static objects that should be drawn onto the background.
+        They are drawn once, the next time the background is drawn,
+        and then only again when this is called.
+
+        Input:
+            * static_objects: List of shapes.StaticShape
+                - The static objects of the level. Invisible ones
+                  are ignored.
+        '''
+
+        self._static_objects = list(static_objects)
+        self._baked = False
+        self._version += 1
+        self._scaled.clear()
+
+    def _bake(self):
+        '''
+        Draws the static objects onto copies of the tiles they overlap.
+        Tiles without static objects are left as they are.
+        '''
+
+        tiles = dict(self._plain_tiles)
+        copied = set()
+        height = self._size[1]
+
+        for obj in self._static_objects:
+            rect = obj.get_draw_rect(height)
+            if rect is None:
+                continue
+            rect = rect.clip(self._rect)
+            if rect.width == 0 or rect.height == 0:
+                continue
+
+            for col, row in self._tiles_in(rect):
+                if (col, row) not in copied:
+                    tiles[(col, row)] = tiles[(col, row)].copy()
+                    copied.add((col, row))
+                obj.draw(tiles[(col, row)],
+                         self._tile_rect(col, row).topleft, height)
+
+        self._tiles = tiles
+        self._baked = True
+
+    def get_scaled(self, scale):
+        '''
+        Returns this background scaled by the factor scale. Each scale is
+        only created once and then cached, so scale should be one of a few
+        fixed values, like the camera's zoom levels.
+
+        Input:
+            * scale: Float
+                - The scale factor. 1.0 returns the background itself.
+        Output:
+            * background: TiledBackground
+                - The scaled background.
+        '''
+
+        if scale == 1:
+            return self
+
+        scaled = self._scaled.get(scale)
+        if scaled is None:
+            scaled = self._create_scaled(scale)
+            self._scaled.put(scale, scaled)
+
+        return scaled
+
+    def _create_scaled(self, scale):
+        '''
+        Creates a scaled copy of the background, tile by tile, so that
+        the whole background never has to be in memory at once.
+        '''
+
+        size = (int(round(self._size[0] * scale)),
+                int(round(self._size[1] * scale)))
+
+        if self._color is not None and not self._static_objects:
+            return TiledBackground.from_color(self._color, size,
+                                              self._tile_size)
+
+        scaled = TiledBackground(size, self._tile_size)
+        sample = self._plain_tiles[(0, 0)]
+        for col, row in scaled._all_tiles():
+            rect = scaled._tile_rect(col, row).clip(scaled._rect)
+
+            # The part of this background that ends up in the new tile,
+            # with a pixel extra on each side so the smoothing
+            # matches up with the neighbouring tiles
+            source = pygame.Rect(int(floor(rect.x / scale)) - 1,
+                                 int(floor(rect.y / scale)) - 1,
+                                 int(ceil(rect.width / scale)) + 3,
+                                 int(ceil(rect.height / scale)) + 3)
+            # NOTE: Blending with RGBA_MAX onto the empty Surface copies
+            #       the pixels exactly, alpha included.
+            part = pygame.Surface(source.size, sample.get_flags(), sample)
+            self.draw(part, source.topleft,
+                      special_flags=pygame.BLEND_RGBA_MAX)
+            part = pygame.transform.smoothscale(
+                part, (int(round(source.width * scale)),
+                       int(round(source.height * scale))))
+
+            tile = pygame.Surface(rect.size, sample.get_flags(), sample)
+            tile.blit(part, (0, 0),
+                      pygame.Rect(int(round(rect.x - source.x * scale)),
+                                  int(round(rect.y - source.y * scale)),
+                                  rect.width, rect.height))
+            scaled._plain_tiles[(col, row)] = tile
+
+        return scaled
+
+    def draw(self, surface, offset, rect=None, special_flags=0):
+        '''
+        Draws the background onto surface.
+
+        Input:
+            * surface: pygame.Surface
+                - The Surface to draw on, usually the screen.
+            * offset: 2-tuple of ints
+                - The position of the upper left corner of surface
+                  relative to the upper left corner of the background.
+            * rect: pygame.Rect
+                - The part of surface that should be drawn.
+                  If None, all of surface is drawn.
+                - Default: None
+            * special_flags: Int
+                - Blend flags passed on to Surface.blit.
+                - Default: 0
+        '''
+
+        if not self._baked:
+            self._bake()
+
+        if rect is None:
+            rect = surface.get_rect()
+
+        # The part of the background that should be drawn
+        area = rect.move(offset).clip(self._rect)
+        if area.width == 0 or area.height == 0:
+            return
+
+        for col, row in self._tiles_in(area):
+            tile_rect = self._tile_rect(col, row)
+            part = tile_rect.clip(area)
+            surface.blit(self._tiles[(col, row)],
+                         (part.x - offset[0], part.y - offset[1]),
+                         part.move(-tile_rect.x, -tile_rect.y),
+                         special_flags)
+
+    def _tile_rect(self, col, row):
+        '''
+        Returns the rect of the tile at (col, row) in background pixels.
+        '''
+
+        ts = self._tile_size
+        return pygame.Rect(col * ts, row * ts, ts, ts)
+
+    def _tiles_in(self, rect):
+        '''
+        Returns a list of the (column, row) of the tiles overlapping rect,
+        which must be inside the background.
+        '''
+
+        ts = self._tile_size
+        return [(col, row)
+                for col in range(rect.left // ts, (rect.right - 1) // ts + 1)
+                for row in range(rect.top // ts, (rect.bottom - 1) // ts + 1)]
+
+    def _all_tiles(self):
+        '''
+        Returns a list of the (column, row) of all tiles.
+        '''
+
+        ts = self._tile_size
+        cols = (self._size[0] + ts - 1) // ts
+        rows = (self._size[1] + ts - 1) // ts
+        return [(col, row) for col in range(cols) for row in range(rows)]
+
+    # Getters/setters
+
+    def get_size(self):
+        return self._size
+
+    def get_rect(self):
+        return self._rect.copy()
+
+    def get_tile_size(self):
+        return self._tile_size
+
+    def get_static_objects(self):
+        return self._static_objects
+
+    def get_version(self):
+        # Changes every time the static objects are changed
+        return self._version
@@ -0,0 +1,167 @@
+# Functions and classes for drawing many sprites at once with a single
+# Surface.blits call, instead of one Surface.blit call per sprite.
+
+import pygame
+
+# Surface.blits was added in pygame 1.9.4; fall back to a loop without it.
+HAVE_BLITS = hasattr(pygame.Surface, 'blits')
+
+
+def blit_all(surface, blit_sequence, return_rects=False):
+    '''
+    Blits everything in blit_sequence onto surface with a single call.
+
+    Input:
+        * surface: pygame.Surface
+            - The Surface to draw on.
+        * blit_sequence: List of tuples
+            - (source, dest) or (source, dest, area, special_flags)
+              tuples, as for Surface.blit.
+        * return_rects: Bool
+            - Whether or not the changed areas should be returned.
+            - Default: False
+    Output:
+        * rects: List of pygame.Rect or None
+            - The changed areas, if return_rects is True.
+    '''
+
+    if HAVE_BLITS:
+        return surface.blits(blit_sequence, int(return_rects))
+
+    blit = surface.blit
+    rects = [blit(*args) for args in blit_sequence]
+    if return_rects:
+        return rects
+    return None
+
+
+def blit_sprites(surface, sprites, return_rects=False):
+    '''
+    Blits the images of all sprites at their rects onto surface
+    with a single call.
+
+    Input:
+        * surface: pygame.Surface
+            - The Surface to draw on.
+        * sprites: Iterable of pygame.sprite.Sprite
+            - The sprites to draw, in drawing order.
+        * return_rects: Bool
+            - Whether or not the changed areas should be returned.
+            - Default: False
+    Output:
+        * rects: List of pygame.Rect or None
+            - The changed areas, if return_rects is True.
+    '''
+
+    return blit_all(surface,
+                    [(sprite.image, sprite.rect) for sprite in sprites],
+                    return_rects)
+
+
+class BatchedDirty(pygame.sprite.LayeredDirty):
+    '''
+    A LayeredDirty group that draws all its changed sprites with one
+    Surface.blits call. Only the sprites that are dirty, and the parts of
+    other sprites that overlap the areas being redrawn, are drawn.
+    '''
+
+    def draw(self, surface, bgd=None):
+        '''
+        Erases and redraws the sprites that have changed since the last
+        call and returns the areas of surface that have changed.
+
+        Input:
+            * surface: pygame.Surface
+                - The Surface to draw on, usually the screen.
+            * bgd: pygame.Surface
+                - The background that is used to erase sprites. If None,
+                  the one set with clear() is used. If neither is set,
+                  nothing is erased and only the changed sprites are drawn.
+                - Default: None
+        Output:
+            * rects: List of pygame.Rect
+                - The areas of surface that have changed.
+        '''
+
+        if bgd is not None:
+            self._bgd = bgd
+
+        sprites = self.sprites()
+        drawn_rects = self.spritedict
+
+        # The areas that have changed: where removed and changed sprites
+        # were drawn last time, and where changed sprites are now
+        areas = list(self.lostsprites)
+        self.lostsprites = []
+        dirty = []
+        for sprite in sprites:
+            if sprite.dirty:
+                dirty.append(sprite)
+                old_rect = drawn_rects.get(sprite)
+                if old_rect:
+                    areas.append(old_rect)
+                if sprite.visible:
+                    areas.append(sprite.rect)
+
+        if not areas:
+            return []
+
+        if self._bgd is not None:
+            # Repaint the changed areas completely: the background first,
+            # then all sprites in them, clipped to the areas
+            areas = _merge_rects(areas)
+            blit_all(surface, [(self._bgd, rect, rect) for rect in areas])
+
+            blit_sequence = []
+            for sprite in sprites:
+                if not sprite.visible:
+                    continue
+                if sprite.dirty:
+                    # Lies completely inside the areas
+                    blit_sequence.append((sprite.image, sprite.rect,
+                                          sprite.source_rect,
+                                          sprite.blendmode))
+                    continue
+                source = sprite.source_rect or sprite.image.get_rect()
+                for index in sprite.rect.collidelistall(areas):
+                    part = sprite.rect.clip(areas[index])
+                    blit_sequence.append(
+                        (sprite.image, part,
+                         part.move(source.x - sprite.rect.x,
+                                   source.y - sprite.rect.y),
+                         sprite.blendmode))
+        else:
+            blit_sequence = [(sprite.image, sprite.rect,
+                              sprite.source_rect, sprite.blendmode)
+                             for sprite in dirty if sprite.visible]
+
+        blit_all(surface, blit_sequence)
+
+        for sprite in dirty:
+            if sprite.visible:
+                drawn_rects[sprite] = sprite.rect.copy()
+            else:
+                # Nothing drawn, so nothing to erase next time
+                drawn_rects[sprite] = 0
+            if sprite.dirty == 1:
+                sprite.dirty = 0
+
+        return areas
+
+
+def _merge_rects(rects):
+    '''
+    Returns a list of non-overlapping rects covering the given rects,
+    by replacing overlapping rects with their union.
+    '''
+
+    merged = []
+    for rect in rects:
+        rect = pygame.Rect(rect)
+        index = rect.collidelist(merged)
+        while index != -1:
+            rect.union_ip(merged.pop(index))
+            index = rect.collidelist(merged)
+        merged.append(rect)
+
+    return merged
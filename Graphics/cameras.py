@@ -1,8 +1,19 @@
 from __future__ import division
 
+from math import log
+
 import pygame
 import yaml
 
+from Graphics import batching
+
+# The number of zoom levels per doubling of the zoom. The camera rounds its
+# zoom to these levels, so that scaled images only have to be created
+# once per level and can then be cached.
+ZOOM_STEPS = 4
+# The color of the parts of the screen outside the world.
+CLEAR_COLOR = (0, 0, 0)
+
 
 class Camera(yaml.YAMLObject):
     '''
@@ -15,7 +26,7 @@ class Camera(yaml.YAMLObject):
     yaml_tag = '!Camera'
 
     def __init__(self, pos=(0.0, 0.0), zoom=1.0, world_size=(600, 480),
-                 margin=100):
+                 margin=100, render_mode='full', redraw_threshold=0.5):
         '''
         Constructor for the Camera object.
 
@@ -28,18 +39,41 @@ class Camera(yaml.YAMLObject):
             * zoom: Float
                 - The conversion factor between world and screen coordinates.
                   1 world unit = zoom screen units; i.e. the scale is 1:zoom.
+                  Rounded to the closest of ZOOM_STEPS levels per doubling.
                 - Default: 1.0
+            * render_mode: String
+                - How the screen is updated each frame.
+                  'full' -> redraw everything and flip the whole display.
+                  'dirty' -> only redraw and update the parts of the screen
+                  that have changed since the last frame.
+                - Default: 'full'
+            * redraw_threshold: Float 0.0 - 1.0
+                - In 'dirty' mode: if the changed parts of the screen cover
+                  more than this fraction of the screen, the whole screen
+                  is redrawn instead.
+                - Default: 0.5
         '''
 
         self._pos = pos
         self._zoom = zoom
+        self._scale = self._round_zoom(zoom)
         self._world_size = world_size
         self._margin = margin
+        self._render_mode = render_mode
+        self._redraw_threshold = redraw_threshold
         screen = pygame.display.get_surface()
         self._size = screen.get_size()
         self._screenrect = screen.get_rect()
         self._screenrect.center = (self._size[0]/2, self._size[1]/2)
 
+        # Bookkeeping for dirty rendering: the rect each sprite was drawn
+        # at last frame, the camera offset used then and whether the next
+        # frame must redraw the whole screen.
+        self._drawn_rects = {}
+        self._drawn_offset = self.get_offset()
+        self._background_version = None
+        self._full_redraw = True
+
     @classmethod
     def from_yaml(cls, loader, node):
         '''
@@ -55,9 +89,12 @@ class Camera(yaml.YAMLObject):
         zoom = values['zoom']
         world_size = values['world_size']
         margin = values['margin']
+        render_mode = values.get('render_mode', 'full')
+        redraw_threshold = values.get('redraw_threshold', 0.5)
 
         # Return an instance of the object
-        return cls(pos=pos, zoom=zoom, world_size=world_size, margin=margin)
+        return cls(pos=pos, zoom=zoom, world_size=world_size, margin=margin,
+                   render_mode=render_mode, redraw_threshold=redraw_threshold)
 
     @classmethod
     def to_yaml(cls, dumper, instance):
@@ -71,7 +108,9 @@ class Camera(yaml.YAMLObject):
         mapping = {'pos': instance._pos,
                    'zoom': instance._zoom,
                    'world_size': instance._world_size,
-                   'margin': instance._margin}
+                   'margin': instance._margin,
+                   'render_mode': instance._render_mode,
+                   'redraw_threshold': instance._redraw_threshold}
 
         # Use YAMLs default representation, but with the custom YAML-tag
         # and using only the properties in out custom mapping
@@ -93,8 +132,10 @@ class Camera(yaml.YAMLObject):
                 - The corresponding screen y-coordinate.
         '''
 
-        w = int(x * self._zoom - self._pos[0])
-        h = int(self._world_size[1] - self._pos[1] - y)
+        # Use the same whole-pixel offset as the background is drawn with
+        offset = self.get_offset()
+        w = int(x * self._scale - offset[0])
+        h = int((self._world_size[1] - y) * self._scale - offset[1])
 
         return w, h
 
@@ -114,11 +155,33 @@ class Camera(yaml.YAMLObject):
                 - The corresponding world y-coordinate.
         '''
 
-        x = (w + self._pos[0]) / self._zoom
-        y = (h + self._pos[1] - self._world_size[1]) / self._zoom
+        offset = self.get_offset()
+        x = (w + offset[0]) / self._scale
+        y = self._world_size[1] - (h + offset[1]) / self._scale
 
         return x, y
 
+    def get_view_bounds(self, margin=0):
+        '''
+        Returns the part of the world that is currently seen by the camera.
+
+        Input:
+            * margin: Float
+                - How much to extend the bounds in each direction,
+                  in world units.
+                - Default: 0
+        Output:
+            * bounds: 4-tuple of floats
+                - The (left, bottom, right, top) edges of the view
+                  in world coordinates.
+        '''
+
+        left, top = self.screen_to_world_coords(0, 0)
+        right, bottom = self.screen_to_world_coords(self._size[0],
+                                                    self._size[1])
+
+        return left - margin, bottom - margin, right + margin, top + margin
+
     def move(self, vec):
         '''
         Moves the camera the distance specified in vec
@@ -126,17 +189,118 @@ class Camera(yaml.YAMLObject):
 
         self._pos = tuple(a + b for a, b in zip(self._pos, vec))
 
+    def get_offset(self):
+        '''
+        Returns the position of the camera rounded to whole pixels,
+        which is what the background and sprites are drawn relative to.
+        '''
+
+        return int(self._pos[0]), int(self._pos[1])
+
+    def set_zoom(self, zoom):
+        '''
+        Zooms the camera, keeping the point in the center of the
+        screen in place.
+
+        Input:
+            * zoom: Float
+                - The new zoom. 1 world unit = zoom screen units.
+        '''
+
+        center = self.screen_to_world_coords(self._size[0]/2,
+                                             self._size[1]/2)
+        self._zoom = zoom
+        self._scale = self._round_zoom(zoom)
+        self._pos = (center[0] * self._scale - self._size[0]/2,
+                     (self._world_size[1] - center[1]) * self._scale
+                     - self._size[1]/2)
+        self._clamp_position()
+        self.force_redraw()
+
+    def zoom_in(self):
+        '''
+        Zooms in one zoom level.
+        '''
+
+        self.set_zoom(self._scale * 2 ** (1 / ZOOM_STEPS))
+
+    def zoom_out(self):
+        '''
+        Zooms out one zoom level.
+        '''
+
+        self.set_zoom(self._scale / 2 ** (1 / ZOOM_STEPS))
+
+    def _clamp_position(self):
+        '''
+        Moves the camera back inside the world, as it is scaled at the
+        current zoom. Along an axis where the world is smaller than the
+        screen, the world is centered on the screen instead.
+        '''
+
+        pos = []
+        for axis in range(2):
+            world = self._world_size[axis] * self._scale
+            screen = self._size[axis]
+            if world <= screen:
+                pos.append((world - screen) / 2)
+            else:
+                pos.append(min(max(self._pos[axis], 0), world - screen))
+        self._pos = tuple(pos)
+
+    def _round_zoom(self, zoom):
+        '''
+        Rounds zoom to the closest zoom level.
+        '''
+
+        return 2 ** (round(log(zoom, 2) * ZOOM_STEPS) / ZOOM_STEPS)
+
+    def force_redraw(self):
+        '''
+        Makes the next update redraw the whole screen, e.g. after something
+        else (like a pop-up menu) has been drawn on top of the game.
+        '''
+
+        self._full_redraw = True
+
     def update(self, game):
         '''
         Updates the camera object to view the player,
-        draws everything to the screen and flips the screen.
+        draws everything to the screen and updates the display.
         '''
-        # FIXME: When moving very fast, the camera moves slightly past
-        #        the edge of the world - this must be fixed.
 
-        sprite_group = game.get_sprite_group()
+        sprites = game.get_visible_sprites()
         screen = pygame.display.get_surface()
         background = game.get_background()
+
+        # If the static scenery has changed, the whole screen is outdated
+        if background.get_version() != self._background_version:
+            self._background_version = background.get_version()
+            self._full_redraw = True
+        background = background.get_scaled(self._scale)
+
+        old_offset = self.get_offset()
+        self._follow_player(game)
+        offset = self.get_offset()
+
+        # The sprites were positioned before the camera moved;
+        # shift them along with the camera.
+        scroll = (offset[0] - old_offset[0], offset[1] - old_offset[1])
+        if scroll != (0, 0):
+            for sprite in sprites:
+                sprite.rect.move_ip(-scroll[0], -scroll[1])
+
+        if self._render_mode == 'dirty' and not self._full_redraw:
+            self._draw_dirty(screen, background, sprites)
+        else:
+            self._draw_full(screen, background, sprites)
+
+    def _follow_player(self, game):
+        '''
+        Moves the camera so that the player is kept on-screen.
+        '''
+
+        screen = pygame.display.get_surface()
         player_obj = game.get_player().get_object()
 
         # Calculate the position of the player relative to
@@ -161,36 +325,136 @@ class Camera(yaml.YAMLObject):
             # The player is too far up
             diff[1] = rel_pos[1] + (self._size[1]/2 - self._margin)
 
-        # Make sure the camera doesn't move past the edge of the world
-        if diff[0] > 0 and self._pos[0] + self._size[0] >= \
-                self._world_size[0]:
-            # Camera wants to move to the right but has reached the right
-            # edge of the world; don't move to the right
-            diff[0] = 0
-        elif diff[0] < 0 and self._pos[0] <= 0:
-            # Camera wants to move to the left but has reached the left
-            # edge of the world; don't move to the left
-            diff[0] = 0
-
-        if diff[1] > 0 and self._pos[1] + self._size[1] >= \
-                self._world_size[1]:
-            # Camera wants to move down but has reached the lower
-            # edge of the world; don't move down
-            diff[1] = 0
-        elif diff[1] < 0 and self._pos[1] <= 0:
-            # Camera wants to move up but has reached the upper
-            # edge of the world; don't move up
-            diff[1] = 0
-
-        # Move the camera to the new position
+        # Move the camera to the new position, but not past
+        # the edge of the world
         self.move(diff)
+        self._clamp_position()
+
+    def _draw_full(self, screen, background, sprites):
+        '''
+        Redraws the background and all sprites and flips the display.
+        '''
 
-        # Clear the screen
-        screen.blit(background, (-self._pos[0], -self._pos[1]))
+        offset = self.get_offset()
+
+        # Clear the screen. Parts of it may be outside the background,
+        # e.g. when the world is smaller than the screen.
+        if not background.get_rect().contains(self._screenrect.move(offset)):
+            screen.fill(CLEAR_COLOR)
+        background.draw(screen, offset)
 
         # Blit everything to the screen
-        for sprite in sprite_group:
-            screen.blit(sprite.image, sprite.rect)
+        batching.blit_sprites(screen, sprites)
 
         # Flip the display
         pygame.display.flip()
+
+        self._finish_frame(sprites, offset)
+
+    def _draw_dirty(self, screen, background, sprites):
+        '''
+        Redraws only the parts of the screen that have changed since
+        the last frame: where sprites have moved from and to, and the parts
+        uncovered by scrolling. Falls back to a full redraw if that
+        would cover too much of the screen.
+        '''
+
+        offset = self.get_offset()
+        scroll = (offset[0] - self._drawn_offset[0],
+                  offset[1] - self._drawn_offset[1])
+        width, height = self._size
+        rects = []
+
+        if scroll != (0, 0):
+            if abs(scroll[0]) >= width or abs(scroll[1]) >= height:
+                # Nothing on the screen can be reused
+                self._draw_full(screen, background, sprites)
+                return
+
+            # Move what's already on the screen along with the camera
+            # and redraw the strips that were scrolled into view.
+            screen.scroll(-scroll[0], -scroll[1])
+            if scroll[0] > 0:
+                rects.append(pygame.Rect(width - scroll[0], 0,
+                                         scroll[0], height))
+            elif scroll[0] < 0:
+                rects.append(pygame.Rect(0, 0, -scroll[0], height))
+            if scroll[1] > 0:
+                rects.append(pygame.Rect(0, height - scroll[1],
+                                         width, scroll[1]))
+            elif scroll[1] < 0:
+                rects.append(pygame.Rect(0, 0, width, -scroll[1]))
+
+            # What was drawn last frame has been scrolled as well
+            for rect in self._drawn_rects.values():
+                rect.move_ip(-scroll[0], -scroll[1])
+
+        # Erase sprites from where they were and draw them where they are
+        drawn_rects = self._drawn_rects
+        for sprite in sprites:
+            old_rect = drawn_rects.pop(sprite, None)
+            if old_rect is None:
+                rects.append(sprite.rect)
+            elif sprite.dirty:
+                rects.append(old_rect)
+                rects.append(sprite.rect)
+        # Sprites that were drawn last frame but are gone or culled now
+        rects.extend(drawn_rects.values())
+
+        rects = [rect.clip(self._screenrect) for rect in rects]
+        rects = [rect for rect in rects if rect.width and rect.height]
+
+        area = sum(rect.width * rect.height for rect in rects)
+        if area > self._redraw_threshold * width * height:
+            self._draw_full(screen, background, sprites)
+            return
+
+        # Repaint each changed rect: first the background, then every
+        # sprite that overlaps it, clipped to the rect.
+        sprite_list = list(sprites)
+        sprite_rects = [sprite.rect for sprite in sprite_list]
+        background_rect = background.get_rect()
+        for rect in rects:
+            screen.set_clip(rect)
+            # The background only covers the world, so clear what's
+            # outside it first, or sprites would leave trails there
+            if not background_rect.contains(rect.move(offset)):
+                screen.fill(CLEAR_COLOR, rect)
+            background.draw(screen, offset, rect)
+            overlapping = rect.collidelistall(sprite_rects)
+            batching.blit_sprites(screen, [sprite_list[index]
+                                           for index in overlapping])
+        screen.set_clip(None)
+
+        pygame.display.update(rects)
+
+        self._finish_frame(sprite_list, offset)
+
+    def _finish_frame(self, sprites, offset):
+        '''
+        Remembers where everything was drawn this frame.
+        '''
+
+        self._drawn_rects = {}
+        for sprite in sprites:
+            self._drawn_rects[sprite] = sprite.rect.copy()
+            if sprite.dirty == 1:
+                sprite.dirty = 0
+        self._drawn_offset = offset
+        self._full_redraw = False
+
+    # Getters/setters
+
+    def get_zoom(self):
+        return self._zoom
+
+    def get_scale(self):
+        # The zoom that is actually used, i.e. rounded to a zoom level
+        return self._scale
+
+    def get_render_mode(self):
+        return self._render_mode
+
+    def set_render_mode(self, render_mode):
+        self._render_mode = render_mode
+        self._full_redraw = True
@@ -0,0 +1,172 @@
+# A cache on disk of decoded (and scaled) images, stored as raw pixels,
+# so that image files don't have to be decoded again every time
+# the game is started.
+
+import mmap
+import os
+import struct
+
+import pygame
+
+from Tools import assets
+
+# The directory the cached images are stored in.
+CACHE_DIR = os.path.join(assets.DATA_DIR, 'cache')
+
+# Every cached image starts with a header: a magic string followed by
+# the width and height of the image and its pixel format (e.g. 'RGBA').
+MAGIC = 'TGRAW1'
+HEADER = struct.Struct('<6sII4s')
+
+# Whether or not the cache is used
+_enabled = True
+# Statistics
+_stats = {'hits': 0, 'misses': 0, 'writes': 0, 'errors': 0}
+
+
+def load(source, size, pixel_format):
+    '''
+    Loads the cached pixels of an image, if there are any.
+
+    Input:
+        * source: 2-tuple of strings
+            - The directory in Data/ and file name of the image file
+              the pixels were decoded from.
+        * size: 2-tuple of ints
+            - The size the image was scaled to, or None if it wasn't scaled.
+        * pixel_format: String
+            - The pygame string format of the pixels, 'RGBA' or 'RGB'.
+    Output:
+        * surface: pygame.Surface or None
+            - A Surface with the pixels, not yet converted to the format
+              of the display, or None if they weren't in the cache.
+    '''
+
+    if not _enabled:
+        return None
+
+    try:
+        path = _cache_path(source, size, pixel_format)
+        if not os.path.exists(path):
+            _stats['misses'] += 1
+            return None
+
+        with open(path, 'rb') as stream:
+            data = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, width, height, stored_format = \
+            HEADER.unpack_from(data, 0)
+        stored_format = stored_format.rstrip('\0')
+        if magic != MAGIC or stored_format != pixel_format or \
+                len(data) != HEADER.size + \
+                width * height * len(pixel_format):
+            # Written by another version, or not written completely
+            _stats['misses'] += 1
+            return None
+
+        # NOTE: The Surface uses the mapped memory directly; it is only
+        #       copied when the Surface is converted for the display.
+        surface = pygame.image.frombuffer(buffer(data, HEADER.size),
+                                          (width, height), pixel_format)
+    except (IOError, OSError, ValueError, struct.error, pygame.error):
+        # The cache is only an optimization, so never let it fail a load
+        _stats['errors'] += 1
+        return None
+
+    _stats['hits'] += 1
+    return surface
+
+
+def save(source, size, pixel_format, surface):
+    '''
+    Stores the pixels of surface in the cache.
+
+    Input:
+        * source: 2-tuple of strings
+            - The directory in Data/ and file name of the image file
+              the pixels were decoded from.
+        * size: 2-tuple of ints
+            - The size the image was scaled to, or None if it wasn't scaled.
+        * pixel_format: String
+            - The pygame string format to store the pixels in,
+              'RGBA' or 'RGB'.
+        * surface: pygame.Surface
+            - The decoded (and scaled) image.
+    '''
+
+    if not _enabled:
+        return
+
+    try:
+        path = _cache_path(source, size, pixel_format)
+        if not os.path.isdir(CACHE_DIR):
+            os.makedirs(CACHE_DIR)
+
+        width, height = surface.get_size()
+        header = HEADER.pack(MAGIC, width, height, pixel_format)
+        pixels = pygame.image.tostring(surface, pixel_format)
+
+        # Write to a temporary file first, so that a game that is
+        # loading at the same time never sees half a file
+        temp_path = '{path}.{pid}.tmp'.format(path=path, pid=os.getpid())
+        with open(temp_path, 'wb') as stream:
+            stream.write(header)
+            stream.write(pixels)
+        if os.path.exists(path):
+            # NOTE: os.rename can't replace files on Windows
+            os.remove(path)
+        os.rename(temp_path, path)
+    except (IOError, OSError, pygame.error):
+        _stats['errors'] += 1
+        return
+
+    _stats['writes'] += 1
+
+
+def _cache_path(source, size, pixel_format):
+    '''
+    Returns the path of the cached pixels for the given source file,
+    size and format. It contains the hash of the source file, so
+    the cached pixels are not used anymore if the file changes.
+    '''
+
+    if size is None:
+        size_name = 'orig'
+    else:
+        size_name = '{0}x{1}'.format(*size)
+
+    return os.path.join(CACHE_DIR, '{hash}_{size}_{format}.raw'.format(
+        hash=assets.get_hash(*source), size=size_name, format=pixel_format))
+
+
+def clear():
+    '''
+    Removes all cached images from disk.
+    '''
+
+    if not os.path.isdir(CACHE_DIR):
+        return
+
+    for file_name in os.listdir(CACHE_DIR):
+        if file_name.endswith('.raw'):
+            os.remove(os.path.join(CACHE_DIR, file_name))
+
+
+def get_stats():
+    '''
+    Returns a dict with the number of hits, misses, writes and errors
+    of the cache.
+    '''
+
+    return dict(_stats)
+
+
+# Getters/setters
+
+def get_enabled():
+    return _enabled
+
+
+def set_enabled(enabled):
+    global _enabled
+    _enabled = enabled
@@ -0,0 +1,198 @@
+# Caches for transformed versions of sprite images, so that moving objects
+# don't have to run pygame.transform on their images every frame.
+
+from __future__ import division
+
+import pygame
+
+from Tools.caching import SizedLRUCache
+
+# The default size, in degrees, of the steps that rotations are rounded to.
+ANGLE_STEP = 2.0
+# The default amount of memory, in bytes, that rotated images may use.
+ROTATION_BUDGET = 32 * 1024 * 1024
+# The default amount of memory, in bytes, that scaled images may use.
+SCALE_BUDGET = 16 * 1024 * 1024
+
+
+def surface_size(surface):
+    '''
+    Returns the approximate number of bytes used by the pixels of surface.
+    '''
+
+    return surface.get_width() * surface.get_height() * surface.get_bytesize()
+
+
+class ScaleCache():
+    '''
+    A cache of scaled images, one per image and scale. Meant to be used
+    with a small set of scales (like the camera's zoom levels), so that
+    each image is only scaled once per zoom level.
+    '''
+
+    def __init__(self, budget=SCALE_BUDGET):
+        '''
+        Constructor for ScaleCache.
+
+        Input:
+            * budget: Int
+                - The maximum number of bytes the scaled images may use.
+                - Default: SCALE_BUDGET
+        '''
+
+        self._cache = SizedLRUCache(budget, surface_size)
+
+    def get_scaled(self, image, scale):
+        '''
+        Returns image scaled by the factor scale.
+        The returned Surface is shared and must not be drawn on.
+
+        Input:
+            * image: pygame.Surface
+                - The unscaled image.
+            * scale: Float
+                - The scale factor. 1.0 returns image itself.
+        Output:
+            * scaled: pygame.Surface
+                - The scaled image.
+        '''
+
+        if scale == 1:
+            return image
+
+        key = (image, scale)
+        scaled = self._cache.get(key)
+        if scaled is None:
+            scaled = scale_surface(image, scale)
+            self._cache.put(key, scaled)
+
+        return scaled
+
+    def clear(self):
+        self._cache.clear()
+
+    def get_stats(self):
+        '''
+        Returns a dict with the hits, misses, evictions, number of entries,
+        bytes used and memory budget of the cache.
+        '''
+
+        return self._cache.get_stats()
+
+
+def scale_surface(image, scale):
+    '''
+    Returns a new Surface with image scaled by the factor scale.
+    Images with a colorkey are scaled without smoothing, since
+    smoothing would blend the colorkey into the edges.
+    '''
+
+    size = (max(1, int(round(image.get_width() * scale))),
+            max(1, int(round(image.get_height() * scale))))
+
+    colorkey = image.get_colorkey()
+    if colorkey is not None or image.get_bitsize() < 24:
+        scaled = pygame.transform.scale(image, size)
+        if colorkey is not None:
+            scaled.set_colorkey(colorkey)
+    else:
+        scaled = pygame.transform.smoothscale(image, size)
+
+    return scaled
+
+
+class RotationCache():
+    '''
+    A cache of rotated images. Angles are rounded to a fixed step, so all
+    sprites that use the same base image share the same set of rotated
+    images. When the rotated images use more memory than the budget,
+    the least recently used ones are thrown away.
+    '''
+
+    def __init__(self, angle_step=ANGLE_STEP, budget=ROTATION_BUDGET):
+        '''
+        Constructor for RotationCache.
+
+        Input:
+            * angle_step: Float
+                - The size of the steps, in degrees, that angles are
+                  rounded to. Lower value -> smoother rotation but
+                  more images to create and store.
+                - Default: ANGLE_STEP
+            * budget: Int
+                - The maximum number of bytes the rotated images may use.
+                - Default: ROTATION_BUDGET
+        '''
+
+        self._angle_step = angle_step
+        self._steps_per_turn = int(round(360 / angle_step))
+        self._cache = SizedLRUCache(budget, surface_size)
+
+    def get_rotated(self, image, angle, scale=1.0):
+        '''
+        Returns image rotated by angle, rounded to the closest step,
+        and scaled by scale. The returned Surface is shared and must
+        not be drawn on.
+
+        Input:
+            * image: pygame.Surface
+                - The unrotated, unscaled base image.
+            * angle: Float
+                - The angle of rotation in degrees, counter-clockwise.
+            * scale: Float
+                - The scale factor, e.g. the camera's zoom. Should be one
+                  of a few fixed values, since each scale is cached
+                  separately.
+                - Default: 1.0
+        Output:
+            * rotated: pygame.Surface
+                - The rotated and scaled image.
+        '''
+
+        # Round the angle to a step, folded into a single turn
+        step = int(round(angle / self._angle_step)) % self._steps_per_turn
+        key = (image, step, scale)
+
+        rotated = self._cache.get(key)
+        if rotated is None:
+            # Rotate the pre-scaled image rather than letting rotozoom
+            # scale it, since that is faster and looks better
+            scaled = scale_cache.get_scaled(image, scale)
+            rotated = pygame.transform.rotozoom(scaled,
+                                                step * self._angle_step, 1)
+            self._cache.put(key, rotated)
+
+        return rotated
+
+    def clear(self):
+        self._cache.clear()
+
+    def get_stats(self):
+        '''
+        Returns a dict with the hits, misses, evictions, number of entries,
+        bytes used and memory budget of the cache.
+        '''
+
+        return self._cache.get_stats()
+
+    # Getters/setters
+
+    def get_angle_step(self):
+        return self._angle_step
+
+    def set_angle_step(self, angle_step):
+        # All cached images are rounded to the old step, throw them away
+        self._angle_step = angle_step
+        self._steps_per_turn = int(round(360 / angle_step))
+        self._cache.clear()
+
+    def get_budget(self):
+        return self._cache.get_budget()
+
+    def set_budget(self, budget):
+        self._cache.set_budget(budget)
+
+
+# The caches shared by all moving shapes
+scale_cache = ScaleCache()
+rotation_cache = RotationCache()
@@ -1,23 +1,61 @@
 import os
+import threading
+from timeit import default_timer
 
 import pygame
 
 from Sound import music
+from Tools.caching import SizedLRUCache
+from Graphics.transform_cache import surface_size
+from Graphics import disk_cache
+from Tools import assets
 
 WIDTH = 600
 HEIGHT = 480
 
+# The default amount of memory, in bytes, that loaded images may use.
+IMAGE_BUDGET = 64 * 1024 * 1024
 
-def init_window():
+# Loaded images, shared by everything that loads the same file at the same
+# size, keyed by (file name, size, pixel format). Size is None for images
+# that aren't scaled.
+_image_cache = SizedLRUCache(IMAGE_BUDGET, surface_size)
+# The total time, in seconds, spent decoding image files
+_decode_time = 0.0
+# Images may be loaded on several threads at once (see Tools/preload.py),
+# so the image cache and decode time are only used while holding this lock
+_image_lock = threading.Lock()
+
+# The default amount of memory, in bytes, that rendered text may use.
+TEXT_BUDGET = 4 * 1024 * 1024
+
+# Loaded fonts, keyed by (file name, size)
+_fonts = {}
+# The files the fonts are read from. pygame reads from them while
+# rendering, so they must be kept alive as long as the fonts.
+_font_sources = []
+# Rendered lines of text, keyed by (font file, size, text, color, antialias)
+_text_cache = SizedLRUCache(TEXT_BUDGET, surface_size)
+
+def init_window(headless=False):
     '''Initializes a pygame window, sets caption, icon and background.
-    Returns the pygame display surface.'''
+    Returns the pygame display surface.
+
+    If headless is True, SDL's dummy video and audio drivers are used,
+    so the "window" is an off-screen surface and no display or sound card
+    is needed. Useful for running the game on servers and for benchmarks.'''
 
-    # Set the position of the window on the screen
-    # (must be called before pygame.init())
-    # FIXME: Apparently, this causes the program to crash on Mac.
-    #        Check why and fix.
-    pos = (500, 300)
-    os.environ['SDL_VIDEO_WINDOW_POS'] = str(pos[0]) + "," + str(pos[1])
+    if headless:
+        # The drivers must be chosen before pygame is initialized
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+        os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    else:
+        # Set the position of the window on the screen
+        # (must be called before pygame.init())
+        # FIXME: Apparently, this causes the program to crash on Mac.
+        #        Check why and fix.
+        pos = (500, 300)
+        os.environ['SDL_VIDEO_WINDOW_POS'] = str(pos[0]) + "," + str(pos[1])
 
     # Setup mixer to avoid sound lag (must be done before initializing pygame)
     pygame.mixer.pre_init(44100, -16, 2, 1024)
@@ -28,13 +66,19 @@ def init_window():
     pygame.__setattr__('music_player', music.Music())
 
     # Initialize the display
-    screen = pygame.display.set_mode([WIDTH, HEIGHT], pygame.NOFRAME)
+    # NOTE: The dummy video driver defaults to 8 bits per pixel, which
+    #       surfaces with per-pixel alpha can't be created from.
+    if headless:
+        screen = pygame.display.set_mode([WIDTH, HEIGHT], pygame.NOFRAME, 32)
+    else:
+        screen = pygame.display.set_mode([WIDTH, HEIGHT], pygame.NOFRAME)
 
     # Decorate window, hide cursor
     # NOTE: Unnecessary if we use pygame.NOFRAME
-    icon = load_image('smiley_small.png')
-    pygame.display.set_caption('Test window')
-    pygame.display.set_icon(icon)
+    if not headless:
+        icon = load_image('smiley_small.png')
+        pygame.display.set_caption('Test window')
+        pygame.display.set_icon(icon)
 
     # TODO: Add more stuff here (?)
 
@@ -48,44 +92,222 @@ def init_window():
     return screen, background
 
 
-def load_image(file_name):
+def load_image(file_name, alpha=True):
     '''
-    Loads the image named file_name.
+    Loads the image named file_name. Images are cached, so the file is
+    only decoded the first time. The returned Surface is shared and must
+    not be drawn on; copy it first if it needs to be changed.
 
     Input:
         * file_name: String
             - The file name of the image that is to be loaded.
+        * alpha: Bool
+            - Whether or not the image should have per pixel alpha.
+            - Default: True
     Output:
         * surface: pygame.Surface
             - A pygame Surface containing the image.
     '''
 
-    base_dir = os.path.join('Data', 'images')
-    full_name = os.path.join(base_dir, file_name)
+    global _decode_time
 
-    try:
-        surface = pygame.image.load(full_name)
-    except pygame.error:
-        print 'Could not load image "{name}".\nError message: {message}'\
-            .format(name=file_name, message=pygame.get_error())
-        raise SystemExit
+    key = (file_name, None, alpha)
+    with _image_lock:
+        surface = _image_cache.get(key)
+    if surface is not None:
+        return surface
 
-    return surface.convert_alpha()
+    source = ('images', file_name)
+    pixel_format = _pixel_format(alpha)
 
+    # Use the already decoded pixels from the disk cache if there are any
+    surface = disk_cache.load(source, None, pixel_format)
+    if surface is None:
+        start = default_timer()
+        try:
+            # NOTE: The file name tells pygame the format of the image
+            #       when it's read from the asset archive
+            surface = pygame.image.load(assets.get_source(*source),
+                                        file_name)
+        except (pygame.error, IOError):
+            print 'Could not load image "{name}".\nError message: {message}'\
+                .format(name=file_name, message=pygame.get_error())
+            raise SystemExit
+        with _image_lock:
+            _decode_time += default_timer() - start
+        disk_cache.save(source, None, pixel_format, surface)
 
-def load_and_scale(file_name, scale):
+    surface = _convert(surface, alpha)
+    with _image_lock:
+        _image_cache.put(key, surface)
+    return surface
+
+
+def load_and_scale(file_name, scale, alpha=True):
     '''
     Loads the image named file_name and scales it to the
-    size specified by scale.
+    size specified by scale. Like load_image(), the result is
+    cached and must not be drawn on.
 
     Input:
         * file_name: String
             - The file name of the image that is to be loaded.
         * scale: 2-Tuple of ints
             - The wanted size of the image in pixels (width, height).
+        * alpha: Bool
+            - Whether or not the image should have per pixel alpha.
+            - Default: True
     Output:
         * surface: pygame.Surface
             - A pygame Surface containing the image.
     '''
 
-    return pygame.transform.smoothscale(load_image(file_name), scale)
+    key = (file_name, tuple(scale), alpha)
+    with _image_lock:
+        surface = _image_cache.get(key)
+    if surface is not None:
+        return surface
+
+    source = ('images', file_name)
+    pixel_format = _pixel_format(alpha)
+
+    # Use the already decoded and scaled pixels from the disk cache
+    # if there are any, so that the image doesn't have to be decoded
+    surface = disk_cache.load(source, key[1], pixel_format)
+    if surface is not None:
+        surface = _convert(surface, alpha)
+    else:
+        surface = pygame.transform.smoothscale(load_image(file_name, alpha),
+                                               key[1])
+        disk_cache.save(source, key[1], pixel_format, surface)
+
+    with _image_lock:
+        _image_cache.put(key, surface)
+    return surface
+
+
+def _pixel_format(alpha):
+    '''
+    Returns the pygame string format used to store the pixels of images
+    with or without per pixel alpha.
+    '''
+
+    if alpha:
+        return 'RGBA'
+    return 'RGB'
+
+
+def _convert(surface, alpha):
+    '''
+    Converts surface to the pixel format of the display, which
+    makes it much faster to blit.
+    '''
+
+    if alpha:
+        return surface.convert_alpha()
+    return surface.convert()
+
+
+def load_font(file_name, size):
+    '''
+    Loads the font in the file named file_name in the given size.
+    Each font is only loaded once and then shared.
+
+    Input:
+        * file_name: String
+            - The file name of the font. If None, pygame's
+              default font is used.
+        * size: Int
+            - The size of the font.
+    Output:
+        * font: pygame.font.Font
+            - The loaded font.
+    '''
+
+    key = (file_name, size)
+    font = _fonts.get(key)
+    if font is None:
+        if file_name is not None:
+            source = assets.get_source('fonts', file_name)
+            _font_sources.append(source)
+        else:
+            source = None
+        font = pygame.font.Font(source, size)
+        _fonts[key] = font
+
+    return font
+
+
+def render_text(font_file, size, text, color, antialias=True):
+    '''
+    Renders a single line of text. Rendered lines are cached, so rendering
+    the same line again costs nothing. The returned Surface is shared and
+    must not be drawn on.
+
+    Input:
+        * font_file: String
+            - The file name of the font, or None for pygame's default font.
+        * size: Int
+            - The size of the font.
+        * text: String
+            - The line of text to render.
+        * color: 3- or 4-tuple of ints
+            - The colour of the text in rgb[a]. They are all ints 0-255.
+        * antialias: Bool
+            - Whether or not the text should be antialiased.
+            - Default: True
+    Output:
+        * surface: pygame.Surface
+            - A pygame Surface containing the rendered text.
+    '''
+
+    key = (font_file, size, text, tuple(color), antialias)
+    surface = _text_cache.get(key)
+    if surface is None:
+        surface = load_font(font_file, size).render(text, antialias, color)
+        _text_cache.put(key, surface)
+
+    return surface
+
+
+def get_text_cache_stats():
+    '''
+    Returns a dict with the hits, misses, evictions, number of entries,
+    bytes used and memory budget of the rendered text cache, and the
+    number of loaded fonts ("fonts").
+    '''
+
+    stats = _text_cache.get_stats()
+    stats['fonts'] = len(_fonts)
+    return stats
+
+
+def get_image_cache_stats():
+    '''
+    Returns a dict with the hits, misses, evictions, number of entries,
+    bytes used ("size") and memory budget of the image cache, and the
+    total time in seconds spent decoding images ("decode_time").
+    '''
+
+    with _image_lock:
+        stats = _image_cache.get_stats()
+        stats['decode_time'] = _decode_time
+    return stats
+
+
+def set_image_cache_budget(budget):
+    '''
+    Sets the maximum number of bytes the cached images may use.
+    '''
+
+    with _image_lock:
+        _image_cache.set_budget(budget)
+
+
+def clear_image_cache():
+    '''
+    Removes all images from the image cache.
+    '''
+
+    with _image_lock:
+        _image_cache.clear()
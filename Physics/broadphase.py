@@ -0,0 +1,111 @@
+# Choosing and tuning the broadphase of the physics space, i.e. how pymunk
+# finds the pairs of shapes that might be colliding.
+
+from __future__ import division
+
+# The broadphases that can be chosen in level files.
+BROADPHASES = ('bbtree', 'spatial_hash', 'auto')
+# With fewer moving shapes than this, auto mode keeps the bounding box tree.
+AUTO_MIN_SHAPES = 50
+# Auto mode uses a spatial hash if 90 % of the moving shapes are at most
+# this many times bigger than the median shape.
+AUTO_MAX_SIZE_SPREAD = 3.0
+# The number of cells in the spatial hash per moving shape in auto mode,
+# and the minimum number of cells.
+CELLS_PER_SHAPE = 10
+MIN_CELLS = 1000
+# The size of the cells of a spatial hash if there are no moving shapes.
+DEFAULT_CELL_SIZE = 50.0
+
+
+def shape_size(shape):
+    '''
+    Returns the size of shape, as the longest side of its bounding box.
+    '''
+
+    bb = shape.cache_bb()
+    return max(bb.right - bb.left, bb.top - bb.bottom)
+
+
+def choose_broadphase(shapes):
+    '''
+    Picks a broadphase from the size distribution of the moving shapes.
+    Many shapes of similar size suit a spatial hash with cells about as big
+    as the shapes; few shapes or very different sizes suit the bounding
+    box tree, which doesn't need to be tuned.
+
+    Input:
+        * shapes: List of pymunk.Shape
+            - The shapes of the moving objects in the level.
+    Output:
+        * broadphase: String
+            - 'bbtree' or 'spatial_hash'.
+        * dim: Float
+            - The size of the cells of the spatial hash, or None.
+        * count: Int
+            - The number of cells of the spatial hash, or None.
+    '''
+
+    if len(shapes) < AUTO_MIN_SHAPES:
+        return 'bbtree', None, None
+
+    sizes = sorted(shape_size(shape) for shape in shapes)
+    median = sizes[len(sizes) // 2]
+    p90 = sizes[int(len(sizes) * 0.9)]
+    if median <= 0 or p90 > median * AUTO_MAX_SIZE_SPREAD:
+        return 'bbtree', None, None
+
+    dim = sum(sizes) / len(sizes)
+    count = max(MIN_CELLS, CELLS_PER_SHAPE * len(shapes))
+    return 'spatial_hash', dim, count
+
+
+def apply_broadphase(space, settings, shapes):
+    '''
+    Sets up the broadphase and solver of space according to the physics
+    settings of a level. Should be called after all shapes have been added.
+
+    Input:
+        * space: pymunk.Space
+            - The physics space of the level.
+        * settings: Dict
+            - The "physics" mapping of the level file, see
+              load_yaml.apply_physics_settings().
+        * shapes: List of pymunk.Shape
+            - The shapes of the moving objects, used in auto mode.
+    Output:
+        * broadphase: String
+            - The broadphase that is used, 'bbtree' or 'spatial_hash'.
+    '''
+
+    broadphase = settings.get('broadphase', 'bbtree')
+    if broadphase not in BROADPHASES:
+        raise ValueError('Unknown broadphase "{name}", should be one of {all}'
+                         .format(name=broadphase, all=', '.join(BROADPHASES)))
+
+    dim = settings.get('spatial_hash_dim')
+    count = settings.get('spatial_hash_count')
+
+    if broadphase == 'auto':
+        broadphase, auto_dim, auto_count = choose_broadphase(shapes)
+        # Values given in the level file take precedence
+        dim = dim or auto_dim
+        count = count or auto_count
+    elif broadphase == 'spatial_hash':
+        if dim is None:
+            if shapes:
+                dim = sum(shape_size(shape) for shape in shapes) / len(shapes)
+            else:
+                dim = DEFAULT_CELL_SIZE
+        if count is None:
+            count = max(MIN_CELLS, CELLS_PER_SHAPE * len(shapes))
+
+    if broadphase == 'spatial_hash':
+        space.use_spatial_hash(dim, count)
+
+    if 'iterations' in settings:
+        space.iterations = settings['iterations']
+    if 'collision_slop' in settings:
+        space.collision_slop = settings['collision_slop']
+
+    return broadphase
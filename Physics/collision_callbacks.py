@@ -3,79 +3,105 @@
 # (apart from the actual collision handling - that is taken care of by the
 # physics engine). Things that can be treated here is for example
 # playing sound, health calculations etc.
+# They are called once per physics step with all the collisions of the
+# step, see collision_events.CollisionEvents.
 
 from __future__ import division
 
+from Physics.collision_events import BEGIN, SEPARATE, IMPULSE, \
+    contact_normal
+
 # Define different collision types
 BASE_TYPE = 0
 STATIC_TYPE = 1
 MOVING_TYPE = 2
 PLAYER_TYPE = 3
 
+# Contacts whose normal, pointing from the player to the other object,
+# points down more steeply than this count as standing on the ground.
+# -0.5 -> slopes of up to 60 degrees.
+GROUND_NORMAL_Y = -0.5
+
 
-def player_static(space, arbiter):
+def touches_ground(body):
     '''
-    Collision callback for collisions between the player and a static object.
+    Checks whether or not body is standing on something right now, from
+    the normals of its current contacts. Unlike the contacts recorded when
+    collisions begin, this also finds contacts that began against the side
+    of an object and then rolled onto its top. Must not be called while
+    the space is being stepped on another thread.
 
     Input:
-        * space: pymunk.Space
-            - The pymunk Space that the objects live in.
-        * arbiter: pymunk.Arbiter
-            - A pymunk Arbiter containing the information about the collision.
+        * body: pymunk.Body
+            - The body to check, e.g. the player's.
+    Output:
+        * on_ground: Bool
+            - Whether or not any contact of body counts as ground.
     '''
 
-    # NOTE: A hack to be able to access the player object here,
-    # not sure if best method...
-    for shape in arbiter.shapes:
-        if shape.collision_type == PLAYER_TYPE:
-            player = shape.player
+    ground = []
 
-    # Reset the "jump" parameter for the player so it can jump again.
-    player.set_jumping(False)
+    def check(arbiter):
+        normal = contact_normal(arbiter, body)
+        if normal is not None and normal.y <= GROUND_NORMAL_Y:
+            ground.append(arbiter)
 
-    # Play bounce sound with volume determined by collision impulse strength.
-    if arbiter.is_first_contact:
-        impulse = arbiter.total_impulse.get_length()
-        player.play_bounce(impulse/1000)
+    body.each_arbiter(check)
+    return bool(ground)
 
 
-def player_moving(space, arbiter):
+def player_static(events):
     '''
-    Collision callback for collisions between the player and a moving object.
+    Handles the collisions between the player and static objects
+    since the last physics step.
 
     Input:
-        * space: pymunk.Space
-            - The pymunk Space that the objects live in.
-        * arbiter: pymunk.Arbiter
-            - A pymunk Arbiter containing the information about the collision.
+        * events: List of collision_events.CollisionEvent
+            - The collisions, in the order they happened. The player
+              is always the a of the events.
     '''
 
-    # NOTE: Currently, this is identical to the above function...
+    for event in events:
+        player = event.a
 
-    # NOTE: A hack to be able to access the player object here,
-    # not sure if best method...
-    for shape in arbiter.shapes:
-        if shape.collision_type == PLAYER_TYPE:
-            player = shape.player
+        if event.kind == BEGIN:
+            # Only count contacts below the player as ground,
+            # so the player can't jump off walls and ceilings
+            if event.normal is not None and \
+                    event.normal.y <= GROUND_NORMAL_Y:
+                player.add_ground_contact(event.b)
+        elif event.kind == SEPARATE:
+            player.remove_ground_contact(event.b)
+        elif event.kind == IMPULSE:
+            # Play bounce sound with volume determined by
+            # collision impulse strength.
+            player.play_bounce(event.impulse.get_length()/1000)
 
-    # Reset the "jump" parameter for the player so it can jump again.
-    player.set_jumping(False)
 
-    # Play bounce sound with volume determined by collision impulse strength.
-    if arbiter.is_first_contact:
-        impulse = arbiter.total_impulse.get_length()
-        player.play_bounce(impulse/1000)
+def player_moving(events):
+    '''
+    Handles the collisions between the player and moving objects
+    since the last physics step.
+
+    Input:
+        * events: List of collision_events.CollisionEvent
+            - The collisions, in the order they happened. The player
+              is always the a of the events.
+    '''
+
+    # NOTE: Currently, this is identical to the above function...
+    player_static(events)
 
 
-def moving_static(space, arbiter):
+def moving_static(events):
     '''
-    Collision callback for collisions between a static and a moving object.
+    Handles the collisions between moving and static objects
+    since the last physics step.
 
     Input:
-        * space: pymunk.Space
-            - The pymunk Space that the objects live in.
-        * arbiter: pymunk.Arbiter
-            - A pymunk Arbiter containing the information about the collision.
+        * events: List of collision_events.CollisionEvent
+            - The collisions, in the order they happened. The moving
+              object is always the a of the events.
     '''
 
     pass
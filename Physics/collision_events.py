@@ -0,0 +1,164 @@
+# Collecting collisions during a physics step and handing them to the game
+# in one batch afterwards, instead of running game code in callbacks
+# for every contact in every step.
+
+from collections import namedtuple
+
+# The kinds of collision events
+BEGIN = 'begin'
+SEPARATE = 'separate'
+IMPULSE = 'impulse'
+
+# A collision between the objects a and b. The kind is BEGIN when they
+# first touch, IMPULSE after the step in which they first touched (with the
+# impulse of that collision) and SEPARATE when they stop touching.
+# For IMPULSE events, impulse is the pymunk.Vec2d impulse applied to
+# a and b. For BEGIN events, normal is the unit pymunk.Vec2d normal of the
+# contact, pointing from a towards b. They are None for the other kinds.
+CollisionEvent = namedtuple('CollisionEvent',
+                            ['kind', 'a', 'b', 'impulse', 'normal'])
+
+
+class CollisionEvents():
+    '''
+    Records the collisions between shapes of chosen collision types in
+    a buffer during physics steps, and hands them to handler functions
+    when dispatch() is called. The objects the shapes belong to are found
+    through a table, which the shapes must be registered in.
+    '''
+
+    def __init__(self):
+        '''
+        Constructor for CollisionEvents.
+        '''
+
+        # Maps pymunk.Shape -> the game object it belongs to
+        self._entities = {}
+        # Maps (collision type a, collision type b) -> handler function
+        self._handlers = {}
+        # The events since the last dispatch, as (type pair, event)
+        self._events = []
+        # Pairs of shapes that started touching in the current step,
+        # waiting for their impulse to be known, as (type pair, a, b)
+        self._begun = []
+
+    def register(self, shape, entity):
+        '''
+        Makes entity the object that collisions of shape are reported for.
+        '''
+
+        self._entities[shape] = entity
+
+    def get_entity(self, shape):
+        return self._entities.get(shape)
+
+    def watch(self, space, type_a, type_b, handler):
+        '''
+        Starts recording collisions between shapes of collision
+        types type_a and type_b in space.
+
+        Input:
+            * space: pymunk.Space
+                - The space to record collisions in.
+            * type_a: Int
+                - The collision type of the first object.
+            * type_b: Int
+                - The collision type of the second object.
+            * handler: function
+                - Called by dispatch() with a list of the CollisionEvents
+                  of these types since the last dispatch, in order.
+                  The objects of type type_a are always the events' a.
+        '''
+
+        pair = (type_a, type_b)
+        self._handlers[pair] = handler
+        space.add_collision_handler(type_a, type_b,
+                                    begin=self._begin,
+                                    separate=self._separate,
+                                    pair=pair)
+
+    def _begin(self, space, arbiter, pair):
+        '''
+        Collision callback for when two shapes start touching.
+        '''
+
+        shape_a, shape_b = arbiter.shapes
+        a = self._entities.get(shape_a)
+        b = self._entities.get(shape_b)
+        self._events.append((pair, CollisionEvent(
+            BEGIN, a, b, None, contact_normal(arbiter, shape_a.body))))
+        self._begun.append((pair, shape_a, shape_b))
+
+        # Let pymunk handle the collision as usual
+        return True
+
+    def _separate(self, space, arbiter, pair):
+        '''
+        Collision callback for when two shapes stop touching.
+        '''
+
+        shape_a, shape_b = arbiter.shapes
+        self._events.append((pair, CollisionEvent(
+            SEPARATE, self._entities.get(shape_a),
+            self._entities.get(shape_b), None, None)))
+
+    def collect_impulses(self):
+        '''
+        Records the impulses of the collisions that began in the last
+        physics step. Must be called after each space.step.
+        '''
+
+        for pair, shape_a, shape_b in self._begun:
+            impulses = []
+
+            def find_impulse(arbiter):
+                if shape_b in arbiter.shapes:
+                    impulses.append(arbiter.total_impulse)
+
+            # NOTE: Objects of the first type are never static, so their
+            #       bodies know about all their collisions.
+            shape_a.body.each_arbiter(find_impulse)
+            if impulses:
+                self._events.append((pair, CollisionEvent(
+                    IMPULSE, self._entities.get(shape_a),
+                    self._entities.get(shape_b), impulses[0], None)))
+
+        self._begun = []
+
+    def dispatch(self):
+        '''
+        Hands the events recorded since the last dispatch to the handlers,
+        one list of events per pair of collision types, and clears them.
+        '''
+
+        if not self._events:
+            return
+
+        batches = {}
+        for pair, event in self._events:
+            batches.setdefault(pair, []).append(event)
+        self._events = []
+
+        for pair, events in batches.items():
+            self._handlers[pair](events)
+
+
+def contact_normal(arbiter, body):
+    '''
+    Returns the normal of the first contact of arbiter, pointing away
+    from body, or None if there are no contacts.
+    '''
+
+    contacts = arbiter.contacts
+    if not contacts:
+        return None
+
+    # Which way pymunk's normal points depends on the kinds of shapes,
+    # so turn it to point the same way as the contact point does,
+    # seen from the centre of body
+    contact = contacts[0]
+    normal = contact.normal
+    if normal.dot(contact.position - body.position) < 0:
+        normal = -normal
+
+    return normal
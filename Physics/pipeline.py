@@ -0,0 +1,169 @@
+# Running the physics simulation on its own thread, so that stepping the
+# world and drawing it can happen at the same time.
+
+import sys
+import threading
+
+
+def take_snapshot(objects):
+    '''
+    Records the current position and angle of the bodies of objects,
+    and whether or not they are sleeping.
+
+    Input:
+        * objects: List of shapes.Shape
+            - The objects to record.
+    Output:
+        * snapshot: Dict
+            - Maps each object to a (position, angle, sleeping) tuple,
+              where position is a 2-tuple of floats, angle is in radians
+              and sleeping is a Bool. Must not be modified, since it is
+              shared between threads.
+    '''
+
+    snapshot = {}
+    for obj in objects:
+        body = obj.get_body()
+        position = body.position
+        snapshot[obj] = ((position[0], position[1]), body.angle,
+                         body.is_sleeping)
+
+    return snapshot
+
+
+class PhysicsPipeline():
+    '''
+    Steps the physics on a separate thread, one frame ahead of what is
+    being drawn. Each frame, the game starts a physics step with
+    begin_frame(), draws the snapshot from the previous step while the
+    step runs, and waits for the step to finish with end_frame().
+
+    Everything that touches the pymunk space while a step is running
+    must be passed to begin_frame() as a command, so that it is run on
+    the physics thread.
+    '''
+
+    def __init__(self, step_func, objects):
+        '''
+        Constructor for PhysicsPipeline.
+
+        Input:
+            * step_func: function
+                - A function without arguments that steps the
+                  physics one frame.
+            * objects: List of shapes.Shape
+                - The objects whose positions should be recorded
+                  after every step.
+        '''
+
+        self._step_func = step_func
+        self._objects = list(objects)
+
+        # Double buffer of snapshots: the front one is being drawn
+        # while the physics thread writes the back one
+        self._snapshots = [None, None]
+        self._front = 0
+
+        self._commands = []
+        self._error = None
+        self._running = False
+        self._thread = None
+        self._step_requested = threading.Event()
+        self._step_done = threading.Event()
+
+    def start(self):
+        '''
+        Records the current state of the objects and
+        starts the physics thread.
+        '''
+
+        snapshot = take_snapshot(self._objects)
+        self._snapshots = [snapshot, snapshot]
+        self._running = True
+        self._step_done.set()
+
+        self._thread = threading.Thread(target=self._run,
+                                        name='physics')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        '''
+        Waits for the current step to finish and stops the physics thread.
+        '''
+
+        if not self._running:
+            return
+
+        self._step_done.wait()
+        self._running = False
+        self._step_requested.set()
+        self._thread.join()
+        self._thread = None
+
+    def begin_frame(self, commands=()):
+        '''
+        Starts a physics step on the physics thread.
+
+        Input:
+            * commands: List of functions
+                - Functions without arguments to run on the physics thread
+                  before the step, e.g. applying impulses from user input.
+        '''
+
+        self._step_done.clear()
+        self._commands = list(commands)
+        self._step_requested.set()
+
+    def end_frame(self):
+        '''
+        Waits for the step started by begin_frame() to finish and makes
+        its snapshot the one returned by get_snapshot().
+        Errors raised on the physics thread are re-raised here.
+        '''
+
+        self._step_done.wait()
+
+        if self._error is not None:
+            # Let the physics thread exit before passing on the error
+            error, self._error = self._error, None
+            self._running = False
+            self._step_requested.set()
+            raise error[0], error[1], error[2]
+
+        self._front = 1 - self._front
+
+    def get_snapshot(self):
+        '''
+        Returns the snapshot that should be drawn this frame.
+        See take_snapshot() for its format.
+        '''
+
+        return self._snapshots[self._front]
+
+    def _run(self):
+        '''
+        The loop of the physics thread.
+        '''
+
+        while True:
+            self._step_requested.wait()
+            self._step_requested.clear()
+            if not self._running:
+                return
+
+            try:
+                for command in self._commands:
+                    command()
+                self._step_func()
+                self._snapshots[1 - self._front] = \
+                    take_snapshot(self._objects)
+            except Exception:
+                self._error = sys.exc_info()
+
+            self._step_done.set()
+
+    # Getters/setters
+
+    def get_running(self):
+        return self._running
@@ -0,0 +1,87 @@
+# Splitting of physics steps into smaller substeps when bodies move fast,
+# so that they don't pass through thin shapes between two steps.
+
+from __future__ import division
+
+from math import ceil
+
+import pymunk
+
+# The default maximum number of substeps a physics step is split into.
+MAX_SUBSTEPS = 8
+# The default fraction of the smallest shape size that
+# a body may move in a single substep.
+SUBSTEP_FRACTION = 0.5
+
+
+def min_feature_size(shapes):
+    '''
+    Returns the size of the thinnest shape among shapes, i.e. the
+    shortest distance a body could move and pass through it.
+
+    Input:
+        * shapes: List of pymunk.Shape
+            - The shapes in the physics space.
+    Output:
+        * size: Float
+            - The smallest thickness of the shapes,
+              or None if there are no shapes.
+    '''
+
+    sizes = []
+    for shape in shapes:
+        if isinstance(shape, pymunk.Segment):
+            # A segment is as thick as twice its radius,
+            # however long it is
+            sizes.append(2 * shape.radius)
+        elif isinstance(shape, pymunk.Circle):
+            sizes.append(2 * shape.radius)
+        else:
+            bb = shape.cache_bb()
+            sizes.append(min(bb.right - bb.left, bb.top - bb.bottom))
+
+    sizes = [size for size in sizes if size > 0]
+    if not sizes:
+        return None
+    return min(sizes)
+
+
+def count_substeps(bodies, dt, feature_size, fraction=SUBSTEP_FRACTION,
+                   max_substeps=MAX_SUBSTEPS):
+    '''
+    Returns the number of substeps a physics step of length dt should be
+    split into, so that no body moves further than fraction of
+    feature_size in one substep.
+
+    Input:
+        * bodies: List of pymunk.Body
+            - The moving bodies in the physics space.
+        * dt: Float
+            - The length of the whole physics step in seconds.
+        * feature_size: Float
+            - The size of the thinnest shape, see min_feature_size().
+              If None, the step isn't split.
+        * fraction: Float
+            - The fraction of feature_size a body may move per substep.
+            - Default: SUBSTEP_FRACTION
+        * max_substeps: Int
+            - The maximum number of substeps.
+            - Default: MAX_SUBSTEPS
+    Output:
+        * substeps: Int
+            - The number of substeps, 1 - max_substeps.
+    '''
+
+    if feature_size is None or max_substeps <= 1:
+        return 1
+
+    max_speed = 0
+    for body in bodies:
+        speed = body.velocity.get_length_sqrd()
+        if speed > max_speed:
+            max_speed = speed
+
+    max_distance = max_speed ** 0.5 * dt
+    substeps = int(ceil(max_distance / (feature_size * fraction)))
+
+    return min(max(substeps, 1), max_substeps)
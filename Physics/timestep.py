@@ -0,0 +1,150 @@
+# A scheduler for stepping the physics with a fixed timestep, independent
+# of how long each frame takes to run and draw.
+
+from __future__ import division
+
+from timeit import default_timer
+
+# The default maximum number of physics steps per frame. If the physics
+# falls further behind than this, the game slows down instead, since
+# trying to catch up would only make each frame take even longer.
+MAX_STEPS = 5
+# The default maximum number of frames in a row that aren't drawn
+# while the physics is catching up.
+MAX_SKIPPED_FRAMES = 3
+
+
+class FixedTimestep():
+    '''
+    Accumulates the real time that has passed and tells how many physics
+    steps of a fixed size should be run to keep up with it. What is left
+    over, less than a step, is given by get_alpha() as a fraction of a step,
+    for interpolating between the last two physics states when drawing.
+    '''
+
+    def __init__(self, step_size, max_steps=MAX_STEPS,
+                 max_skipped_frames=MAX_SKIPPED_FRAMES):
+        '''
+        Constructor for FixedTimestep.
+
+        Input:
+            * step_size: Float
+                - The length of each physics step in seconds.
+            * max_steps: Int
+                - The maximum number of steps per frame.
+                - Default: MAX_STEPS
+            * max_skipped_frames: Int
+                - The maximum number of frames in a row that
+                  may be skipped when behind.
+                - Default: MAX_SKIPPED_FRAMES
+        '''
+
+        self._step_size = step_size
+        self._max_steps = max_steps
+        self._max_skipped_frames = max_skipped_frames
+        self._accumulator = 0.0
+        self._last_time = None
+        self._behind = False
+        self._skipped_frames = 0
+        # Statistics
+        self._steps = 0
+        self._dropped_time = 0.0
+
+    def advance(self, elapsed=None):
+        '''
+        Adds the time that has passed since the last call and returns the
+        number of steps that should be run this frame.
+
+        Input:
+            * elapsed: Float
+                - The time that has passed, in seconds. If None, the real
+                  time since the last call is used (one step's worth
+                  for the first call).
+                - Default: None
+        Output:
+            * steps: Int
+                - The number of physics steps to run, 0 - max_steps.
+        '''
+
+        now = default_timer()
+        if elapsed is None:
+            if self._last_time is None:
+                elapsed = self._step_size
+            else:
+                elapsed = now - self._last_time
+        self._last_time = now
+
+        self._accumulator += elapsed
+        steps = min(int(self._accumulator / self._step_size),
+                    self._max_steps)
+        self._accumulator -= steps * self._step_size
+
+        # Still a step or more behind after running as many steps as
+        # allowed: don't let the backlog grow without bounds
+        self._behind = self._accumulator >= self._step_size
+        if self._behind:
+            limit = self._max_steps * self._step_size
+            if self._accumulator > limit:
+                self._dropped_time += self._accumulator - limit
+                self._accumulator = limit
+
+        self._steps += steps
+        return steps
+
+    def should_draw(self):
+        '''
+        Returns whether or not the current frame should be drawn. Frames are
+        skipped while the physics is behind, but never too many in a row.
+        '''
+
+        if self._behind and \
+                self._skipped_frames < self._max_skipped_frames:
+            self._skipped_frames += 1
+            return False
+
+        self._skipped_frames = 0
+        return True
+
+    def reset(self):
+        '''
+        Forgets the time that has passed, e.g. after the game has been
+        paused, so that the physics doesn't try to catch up with it.
+        '''
+
+        self._accumulator = 0.0
+        self._last_time = None
+        self._behind = False
+        self._skipped_frames = 0
+
+    def get_alpha(self):
+        '''
+        Returns how far, as a fraction 0.0 - 1.0 of a step, the current time
+        is past the last physics step.
+        '''
+
+        return min(self._accumulator / self._step_size, 1.0)
+
+    def get_stats(self):
+        '''
+        Returns a dict with the total number of steps run and the time
+        in seconds that was dropped because the physics was too far behind.
+        '''
+
+        return {'steps': self._steps, 'dropped_time': self._dropped_time}
+
+    # Getters/setters
+
+    def get_step_size(self):
+        return self._step_size
+
+    def set_step_size(self, step_size):
+        self._step_size = step_size
+
+    def get_max_steps(self):
+        return self._max_steps
+
+    def set_max_steps(self, max_steps):
+        self._max_steps = max_steps
+
+    def get_behind(self):
+        return self._behind
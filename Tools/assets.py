@@ -0,0 +1,189 @@
+# Access to the files in Data/, either from the packed asset archive
+# (see Tools/pack_assets.py) or, if it doesn't exist or doesn't contain
+# a file, from the loose files.
+
+from cStringIO import StringIO
+import hashlib
+import json
+import mmap
+import os
+import struct
+
+# The directory all assets are in.
+DATA_DIR = 'Data'
+# The path of the packed asset archive.
+ARCHIVE_PATH = os.path.join(DATA_DIR, 'assets.pak')
+
+# An archive starts with a header: a magic string and the length of
+# the index that follows it. The index is a JSON object that maps the
+# name of each file, relative to DATA_DIR and with '/' as separator, to
+# [offset, length, format, hash], where offset is from the start of the
+# archive, format is the file extension and hash is the SHA-1 of the file.
+MAGIC = 'TGPAK1'
+HEADER = struct.Struct('<6sI')
+
+
+class AssetArchive():
+    '''
+    A packed asset archive, mapped into memory. Files are read as slices
+    of the mapped archive, without being copied.
+    '''
+
+    def __init__(self, path):
+        '''
+        Constructor for AssetArchive. Maps the archive at path into memory
+        and reads its index.
+
+        Input:
+            * path: String
+                - The path of the archive.
+        '''
+
+        with open(path, 'rb') as stream:
+            self._data = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, index_length = HEADER.unpack_from(self._data, 0)
+        if magic != MAGIC:
+            raise ValueError('"{path}" is not an asset archive'
+                             .format(path=path))
+
+        self._index = json.loads(
+            self._data[HEADER.size:HEADER.size + index_length])
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def get_data(self, name):
+        '''
+        Returns the contents of the file called name as a read-only buffer
+        that refers directly to the mapped archive.
+        '''
+
+        offset, length = self._index[name][:2]
+        return buffer(self._data, offset, length)
+
+    def get_format(self, name):
+        return self._index[name][2]
+
+    def get_hash(self, name):
+        return self._index[name][3]
+
+    def get_names(self):
+        return sorted(self._index)
+
+
+# The archive in use: None before it has been opened,
+# False if there is no archive
+_archive = None
+# Maps the path of a loose file to (modification time, size, hash),
+# so files only have to be hashed again when they change
+_hashes = {}
+
+
+def get_archive():
+    '''
+    Returns the asset archive, opening it the first time.
+    Returns None if there is no (valid) archive.
+    '''
+
+    global _archive
+
+    if _archive is None:
+        _archive = False
+        if os.path.exists(ARCHIVE_PATH):
+            try:
+                _archive = AssetArchive(ARCHIVE_PATH)
+            except (IOError, OSError, ValueError, struct.error), message:
+                print 'Cannot use asset archive:', message
+
+    return _archive or None
+
+
+def set_archive(path):
+    '''
+    Uses the archive at path instead of the default one.
+    If path is None, no archive is used and all files are loose files.
+    '''
+
+    global _archive
+
+    if path is None:
+        _archive = False
+    else:
+        _archive = AssetArchive(path)
+
+
+def get_path(directory, file_name):
+    '''
+    Returns the path of a loose file in Data/.
+
+    Input:
+        * directory: String
+            - The directory in Data/, e.g. 'images'.
+        * file_name: String
+            - The name of the file in that directory.
+    '''
+
+    return os.path.join(DATA_DIR, directory, file_name)
+
+
+def get_source(directory, file_name):
+    '''
+    Returns something pygame can load a file from: a file-like object
+    reading from the archive if the file is in it, or the path of the
+    loose file otherwise.
+
+    Input:
+        * directory: String
+            - The directory in Data/, e.g. 'images'.
+        * file_name: String
+            - The name of the file in that directory.
+    Output:
+        * source: File-like object or String
+            - Can be passed to e.g. pygame.image.load or pygame.mixer.Sound.
+    '''
+
+    archive = get_archive()
+    name = directory + '/' + file_name
+    if archive is not None and name in archive:
+        # NOTE: cStringIO reads directly from the buffer, without copying
+        return StringIO(archive.get_data(name))
+
+    return get_path(directory, file_name)
+
+
+def open_file(directory, file_name):
+    '''
+    Opens a file in Data/ for reading, from the archive if it's in it.
+    The returned file-like object should be closed after use.
+    '''
+
+    source = get_source(directory, file_name)
+    if isinstance(source, basestring):
+        return open(source, 'rb')
+    return source
+
+
+def get_hash(directory, file_name):
+    '''
+    Returns the SHA-1 hash of the contents of a file in Data/ as a
+    hex string. Hashes of files in the archive are stored in it;
+    loose files are hashed when they are first asked for or have changed.
+    '''
+
+    archive = get_archive()
+    name = directory + '/' + file_name
+    if archive is not None and name in archive:
+        return archive.get_hash(name)
+
+    path = get_path(directory, file_name)
+    info = os.stat(path)
+    known = _hashes.get(path)
+    if known is not None and known[:2] == (info.st_mtime, info.st_size):
+        return known[2]
+
+    with open(path, 'rb') as stream:
+        digest = hashlib.sha1(stream.read()).hexdigest()
+    _hashes[path] = (info.st_mtime, info.st_size, digest)
+
+    return digest
@@ -0,0 +1,93 @@
+# A benchmark comparing drawing sprites with one Surface.blit call per
+# sprite against drawing them all with a single Surface.blits call.
+# Run from the root of the repository:
+#     python -m Tools.benchmark_blitting
+
+from __future__ import division
+import os
+import random
+import timeit
+
+# Draw to an off-screen window; no display is needed
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+from Graphics import batching
+
+SCREEN_SIZE = (600, 480)
+SPRITE_COUNTS = [1000, 2000, 5000, 10000]
+REPEATS = 20
+
+
+def create_sprites(count, images):
+    '''
+    Creates count sprites at random positions on the screen,
+    using the given images.
+    '''
+
+    sprites = []
+    for i in range(count):
+        sprite = pygame.sprite.DirtySprite()
+        sprite.image = random.choice(images)
+        sprite.rect = sprite.image.get_rect(
+            center=(random.randint(0, SCREEN_SIZE[0]),
+                    random.randint(0, SCREEN_SIZE[1])))
+        sprites.append(sprite)
+
+    return sprites
+
+
+def draw_loop(screen, sprites):
+    '''
+    The old way of drawing: one blit per sprite.
+    '''
+
+    for sprite in sprites:
+        screen.blit(sprite.image, sprite.rect)
+
+
+def draw_batched(screen, sprites):
+    '''
+    The new way of drawing: one blits call for all sprites.
+    '''
+
+    batching.blit_sprites(screen, sprites)
+
+
+def main():
+    pygame.display.init()
+    screen = pygame.display.set_mode(SCREEN_SIZE)
+
+    # A mix of small images with and without per-pixel alpha, like the
+    # ones used by the shapes in the game
+    images = []
+    for size in [8, 16, 24]:
+        image = pygame.Surface((size, size), pygame.SRCALPHA)
+        pygame.draw.circle(image, (200, 50, 50, 255),
+                           (size // 2, size // 2), size // 2)
+        images.append(image.convert_alpha())
+        images.append(pygame.Surface((size, size)).convert())
+
+    print('Surface.blits available: {0}'.format(batching.HAVE_BLITS))
+    print('{0:>8} {1:>12} {2:>12} {3:>8}'.format('sprites', 'loop (ms)',
+                                                 'blits (ms)', 'speedup'))
+
+    random.seed(0)
+    for count in SPRITE_COUNTS:
+        sprites = create_sprites(count, images)
+
+        loop_time = min(timeit.repeat(lambda: draw_loop(screen, sprites),
+                                      number=1, repeat=REPEATS))
+        batched_time = min(timeit.repeat(
+            lambda: draw_batched(screen, sprites), number=1, repeat=REPEATS))
+
+        print('{0:>8} {1:>12.3f} {2:>12.3f} {3:>7.2f}x'.format(
+            count, loop_time * 1000, batched_time * 1000,
+            loop_time / batched_time))
+
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
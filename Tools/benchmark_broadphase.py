@@ -0,0 +1,114 @@
+# A benchmark comparing the broadphases of the physics space (see
+# Physics/broadphase.py) on generated levels crowded with small shapes.
+# Run from the root of the repository:
+#     python -m Tools.benchmark_broadphase
+
+from __future__ import division
+import random
+import timeit
+
+import pymunk
+
+from Physics import broadphase
+
+WORLD_SIZE = (2000, 1200)
+SHAPE_COUNTS = [100, 500, 1000, 2000]
+STEPS = 60
+REPEATS = 3
+# Settings for the broadphases to compare, as in the level files
+OPTIONS = [('bbtree', {'broadphase': 'bbtree'}),
+           ('spatial_hash', {'broadphase': 'spatial_hash'}),
+           ('auto', {'broadphase': 'auto'})]
+
+
+def create_level(count, mixed_sizes):
+    '''
+    Creates a space with walls around it and count boxes and balls at
+    random positions. If mixed_sizes is True, the sizes of the shapes
+    vary a lot, otherwise they are about the same.
+
+    Output:
+        * space: pymunk.Space
+        * shapes: List of pymunk.Shape
+            - The moving shapes.
+    '''
+
+    space = pymunk.Space()
+    space.gravity = (0, -900)
+
+    width, height = WORLD_SIZE
+    corners = [(0, 0), (width, 0), (width, height), (0, height)]
+    for i in range(4):
+        wall = pymunk.Segment(space.static_body, corners[i],
+                              corners[(i + 1) % 4], 5)
+        wall.friction = 1.0
+        space.add(wall)
+
+    shapes = []
+    for i in range(count):
+        if mixed_sizes:
+            size = random.choice([5, 10, 20, 80, 160])
+        else:
+            size = random.uniform(8, 16)
+        mass = 1
+        pos = (random.uniform(size, width - size),
+               random.uniform(size, height - size))
+
+        if i % 2:
+            body = pymunk.Body(mass, pymunk.moment_for_circle(mass, 0, size))
+            shape = pymunk.Circle(body, size)
+        else:
+            points = [(-size, -size), (size, -size),
+                      (size, size), (-size, size)]
+            body = pymunk.Body(mass, pymunk.moment_for_poly(mass, points))
+            shape = pymunk.Poly(body, points)
+        body.position = pos
+        shape.friction = 0.5
+        space.add(body, shape)
+        shapes.append(shape)
+
+    return space, shapes
+
+
+def run(count, mixed_sizes, settings):
+    '''
+    Creates a level, sets up its broadphase and returns the time it
+    takes to step it STEPS times, and the broadphase that was used.
+    '''
+
+    random.seed(count)
+    space, shapes = create_level(count, mixed_sizes)
+    used = broadphase.apply_broadphase(space, settings, shapes)
+
+    def step():
+        for i in range(STEPS):
+            space.step(1 / 60)
+
+    return timeit.timeit(step, number=1), used
+
+
+def main():
+    for mixed_sizes in [False, True]:
+        if mixed_sizes:
+            print('Shapes of very different sizes')
+        else:
+            print('Shapes of similar sizes')
+        print('Milliseconds per step, and the broadphase used')
+        print('{0:>8}'.format('shapes') +
+              ''.join(' {0:>14}'.format(name)
+                      for name, settings in OPTIONS))
+
+        for count in SHAPE_COUNTS:
+            times = []
+            for name, settings in OPTIONS:
+                results = [run(count, mixed_sizes, settings)
+                           for i in range(REPEATS)]
+                best = min(time for time, used in results)
+                times.append(' {0:>9.1f} {1:>4}'.format(
+                    best * 1000 / STEPS, results[0][1][:4]))
+            print('{0:>8}'.format(count) + ''.join(times))
+        print('')
+
+
+if __name__ == '__main__':
+    main()
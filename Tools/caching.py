@@ -0,0 +1,136 @@
+# A generic least-recently-used cache with a size budget.
+# Used as the storage for the different surface caches in the game.
+
+from collections import OrderedDict
+
+
+class SizedLRUCache():
+    '''
+    A cache that keeps track of the total size of its entries and
+    evicts the least recently used ones when that size exceeds a budget.
+    It also counts hits, misses and evictions.
+    '''
+
+    def __init__(self, budget, size_func=len):
+        '''
+        Constructor for SizedLRUCache.
+
+        Input:
+            * budget: Int
+                - The maximum total size of all entries in the cache,
+                  in whatever unit size_func returns (e.g. bytes).
+            * size_func: function
+                - A function that takes a value and returns its size.
+                - Default: len
+        '''
+
+        # Maps key -> (value, size), ordered from least to most recently used
+        self._entries = OrderedDict()
+        self._budget = budget
+        self._size_func = size_func
+        self._total_size = 0
+
+        # Statistics
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        # NOTE: Does not count as a hit or miss, and does not
+        #       mark the entry as recently used.
+        return key in self._entries
+
+    def get(self, key, default=None):
+        '''
+        Returns the value stored for key and marks it as the most
+        recently used entry. If key isn't in the cache, default is returned.
+        '''
+
+        try:
+            entry = self._entries.pop(key)
+        except KeyError:
+            self._misses += 1
+            return default
+
+        # Re-insert the entry to move it to the "recently used" end
+        self._entries[key] = entry
+        self._hits += 1
+        return entry[0]
+
+    def put(self, key, value):
+        '''
+        Stores value under key, evicting old entries if the budget
+        is exceeded. Values that are bigger than the whole budget
+        are not stored at all.
+        '''
+
+        self.remove(key)
+
+        size = self._size_func(value)
+        if size > self._budget:
+            return
+
+        self._entries[key] = (value, size)
+        self._total_size += size
+        self._evict()
+
+    def remove(self, key):
+        '''
+        Removes the entry for key, if there is one.
+        '''
+
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_size -= entry[1]
+
+    def clear(self):
+        '''
+        Removes all entries from the cache. The statistics are kept.
+        '''
+
+        self._entries.clear()
+        self._total_size = 0
+
+    def _evict(self):
+        '''
+        Removes least recently used entries until the budget is met.
+        '''
+
+        while self._total_size > self._budget:
+            key, entry = self._entries.popitem(last=False)
+            self._total_size -= entry[1]
+            self._evictions += 1
+
+    def get_stats(self):
+        '''
+        Returns a dict with statistics about the cache: number of
+        hits, misses, evictions and entries, and the current total size
+        and budget.
+        '''
+
+        return {'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'entries': len(self._entries),
+                'size': self._total_size,
+                'budget': self._budget}
+
+    def reset_stats(self):
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    # Getters/setters
+
+    def get_budget(self):
+        return self._budget
+
+    def set_budget(self, budget):
+        self._budget = budget
+        self._evict()
+
+    def get_total_size(self):
+        return self._total_size
@@ -1,6 +1,6 @@
 # Functions that handle YAML-files and load menus and levels from them.
 
-import os
+from contextlib import closing
 
 import yaml
 import pygame
@@ -8,7 +8,10 @@ import pymunk
 
 from GamePlay import gameclass
 from Physics import collision_callbacks as col_call
-from Graphics import view
+from Physics import collision_events
+from Physics import timestep, substepping, broadphase
+from Graphics import view, backgrounds, batching
+from Tools import assets, preload, prefetch
 
 # YAML needs these imports to be able to create the objects
 from UI import menu_items
@@ -42,21 +45,24 @@ def load_menu(file_name):
     # TODO: Remove "screen" from output? It can be referenced
     #       directly via pygame.
 
-    # Get the full relative path of the YAML-file
-    base_dir = os.path.join('Data', 'menu_files')
-    fullname = os.path.join(base_dir, file_name)
+    # Load the YAML-file, from the asset archive if it's in it
+    with closing(assets.open_file('menu_files', file_name)) as stream:
+        text = stream.read()
 
-    # Load the YAML-file
-    with open(fullname, 'r') as stream:
-        item_dict = yaml.load(stream)
+    # Decode the images of the menu in parallel before creating it
+    preload.preload_images(preload.find_images(
+        text, pygame.display.get_surface().get_size()))
+
+    item_dict = yaml.load(text)
 
     # Create a screen and background
     background_image_file = item_dict['background_file']
     background_color = item_dict['background']
-    info = pygame.display.Info()
-    width = info.current_w
-    height = info.current_h
+    # NOTE: Use the size of the display surface rather than
+    #       display.Info(), which isn't reliable with the dummy
+    #       video driver in headless mode.
     screen = pygame.display.get_surface()
+    width, height = screen.get_size()
 
     if background_image_file is not None:
         background = view.load_and_scale(background_image_file,
@@ -103,14 +109,13 @@ def load_menu(file_name):
                            item, ', with key: ', key)
 
     # Create a Sprite group for the objects
-    obj_group = pygame.sprite.LayeredDirty(*objs)
+    obj_group = batching.BatchedDirty(*objs)
     # Set the background of the Sprite group
     obj_group.clear(screen, background)
 
     pygame.display.flip()
 
     # Start the music
-    # TODO: Add smooth fading between songs.
     if music_file is not None:
         # Get the currently loaded song and whether it's playing
         current_song, playing = pygame.music_player.get_playing()
@@ -122,7 +127,8 @@ def load_menu(file_name):
             # The right song is loaded, but not playing; start the song
             pygame.music_player.play()
         else:
-            # The wrong song is loaded; load the right one and start it
+            # The wrong song is loaded; load the right one in the
+            # background and fade over to it when it's ready
             pygame.music_player.load_and_play(music_file)
 
         pygame.music_player.set_volume(vol)
@@ -130,6 +136,27 @@ def load_menu(file_name):
     return buttons, obj_group, screen, background
 
 
+def construct_yaml(node):
+    '''
+    Creates the Python objects described by a parsed YAML node graph,
+    like yaml.load does for a YAML-file. A new set of objects is created
+    every time, so the same node can be used several times.
+
+    Input:
+        * node: yaml.Node
+            - The root node, as returned by yaml.compose.
+    Output:
+        * data: Any
+            - The objects described by node.
+    '''
+
+    loader = yaml.Loader('')
+    try:
+        return loader.construct_document(node)
+    finally:
+        loader.dispose()
+
+
 def load_level(file_name):
     '''
     Loads the level defined in the YAML-file named "file_name".
@@ -139,33 +166,29 @@ def load_level(file_name):
             - A Game object containing all info about the level.
     '''
 
-    # Get the full relative path of the YAML-file
-    base_dir = os.path.join('Data', 'level_files')
-    fullname = os.path.join(base_dir, file_name)
+    # Use the level parsed in the background by the prefetcher if
+    # there is one, otherwise parse the YAML-file and decode its images
+    node = prefetch.level_prefetcher.take(file_name)
+    if node is None:
+        node = prefetch.prefetch_level(file_name)
 
-    # Load the YAML-file
-    with open(fullname, 'r') as stream:
-        item_dict = yaml.load(stream)
+    item_dict = construct_yaml(node)
 
     # Create game object
     game = gameclass.Game()
 
-    # Create a screen and background
+    # Create a background, split into tiles so that only the visible
+    # parts of it have to be drawn
     background_image_file = item_dict['background_file']
     background_color = item_dict['background']
     width, height = item_dict['size']
 
     if background_image_file is not None:
-        background = view.load_and_scale(background_image_file,
-                                         (width, height))
+        background = backgrounds.TiledBackground.from_surface(
+            view.load_and_scale(background_image_file, (width, height)))
     else:
-        if len(background_color) == 4:
-            # Alpha value specified
-            background = pygame.Surface([width, height], pygame.SRCALPHA)
-        else:
-            # Only RGB specified
-            background = pygame.Surface([width, height])
-        background.fill(background_color)
+        background = backgrounds.TiledBackground.from_color(
+            background_color, (width, height))
 
     # Create other game related objects
     FPS = 60
@@ -182,16 +205,20 @@ def load_level(file_name):
     space = pymunk.Space()
     game.set_space(space)
 
-    # Add post-collision handlers to the space
+    # Record collisions during the physics steps and hand them to the
+    # collision callbacks once per step
     # NOTE: In these, we can e.g. play collision sounds, reset jumping flags...
-    space.add_collision_handler(col_call.PLAYER_TYPE, col_call.STATIC_TYPE,
-                                post_solve=col_call.player_static)
-    space.add_collision_handler(col_call.PLAYER_TYPE, col_call.MOVING_TYPE,
-                                post_solve=col_call.player_static)
+    collisions = collision_events.CollisionEvents()
+    collisions.watch(space, col_call.PLAYER_TYPE, col_call.STATIC_TYPE,
+                     col_call.player_static)
+    collisions.watch(space, col_call.PLAYER_TYPE, col_call.MOVING_TYPE,
+                     col_call.player_moving)
+    game.set_collision_events(collisions)
 
     # Initialize Sprite Groups
+    # NOTE: The group is given to the game when all sprites have been added,
+    #       since the game remembers their drawing order.
     all_sprites = pygame.sprite.LayeredDirty()
-    game.set_sprite_group(all_sprites)
 
     # Handle the objects from the YAML-file
     for key in item_dict:
@@ -204,29 +231,35 @@ def load_level(file_name):
             pass
         elif key == 'size':
             pass
+        elif key == 'physics':
+            pass
         elif key == 'defaults':
             pass
         else:
             for item in item_dict[key]:
                 if key == 'static_objects':
                     # All static objects should be added to
-                    # the space and the game
-                    # TODO: Static, viewable objects should be added to the
-                    #       sprite grounp aswell
+                    # the space and the game. Visible ones are drawn onto
+                    # the background by the game, so they don't need sprites.
                     space.add(item.get_shape())
                     game.add_static_objects(item)
+                    collisions.register(item.get_shape(), item)
                 elif key == 'moving_objects':
                     # All moving objects should be added to the space,
                     # the game and the sprite group
                     space.add(item.get_body(), item.get_shape())
                     game.add_moving_objects(item)
                     all_sprites.add(item)
+                    collisions.register(item.get_shape(), item)
                 elif key == 'player':
                     # Add the player to the game
                     space.add(item.get_object().get_body(),
                               item.get_object().get_shape())
                     game.set_player(item)
                     all_sprites.add(item.get_object())
+                    # Collisions of the player's shape are
+                    # reported for the player itself
+                    collisions.register(item.get_object().get_shape(), item)
                 elif key == 'music':
                     # Extract the info
                     music_file = item['file']
@@ -239,6 +272,11 @@ def load_level(file_name):
                     print ('Unknown object found when loading menu: ',
                            item, ', with key: ', key)
 
+    game.set_sprite_group(all_sprites)
+
+    # Apply the physics settings of the level, if there are any
+    apply_physics_settings(game, item_dict.get('physics') or {})
+
     # Update all moving objects
     all_sprites.update(game)
 
@@ -257,7 +295,8 @@ def load_level(file_name):
             # The right song is loaded, but not playing; start the song
             pygame.music_player.play()
         else:
-            # The wrong song is loaded; load the right one and start it
+            # The wrong song is loaded; load the right one in the
+            # background and fade over to it when it's ready
             pygame.music_player.load_and_play(music_file)
 
         pygame.music_player.set_volume(vol)
@@ -265,6 +304,88 @@ def load_level(file_name):
     return game
 
 
+def apply_physics_settings(game, settings):
+    '''
+    Applies the physics settings of a level to the game.
+
+    Input:
+        * game: gameclass.Game
+            - The Game object of the level.
+        * settings: Dict
+            - The "physics" mapping of the level file. Settings that
+              are left out keep their default values:
+                - pipelined: Bool
+                    - Whether or not the physics should be run on a
+                      separate thread, at the same time as drawing.
+                    - Default: False
+                - fixed_timestep: Bool
+                    - Whether or not the physics should be stepped with a
+                      fixed timestep, independent of the frame rate.
+                      Not used when pipelined.
+                    - Default: True
+                - max_steps: Int
+                    - The maximum number of physics steps per frame
+                      with a fixed timestep.
+                    - Default: timestep.MAX_STEPS
+                - sleep_time_threshold: Float
+                    - The time in seconds a body must have been idle
+                      before it falls asleep. Sleeping bodies are not
+                      simulated, and their sprites are not updated.
+                      None -> bodies never sleep.
+                    - Default: None
+                - idle_speed_threshold: Float
+                    - The speed below which a body is considered idle.
+                      0 -> pymunk chooses one based on the gravity.
+                    - Default: 0
+                - broadphase: String
+                    - How pymunk finds shapes that may collide:
+                      'bbtree' (a bounding box tree), 'spatial_hash'
+                      (best for many shapes of similar size) or 'auto'
+                      (chosen from the sizes of the moving shapes).
+                    - Default: 'bbtree'
+                - spatial_hash_dim: Float
+                    - The size of the cells of the spatial hash.
+                    - Default: The average size of the moving shapes.
+                - spatial_hash_count: Int
+                    - The number of cells of the spatial hash.
+                    - Default: 10 per moving shape, at least 1000.
+                - iterations: Int
+                    - The number of iterations of the collision solver.
+                      Higher -> more accurate but slower.
+                    - Default: pymunk's default (10)
+                - collision_slop: Float
+                    - How far shapes may overlap before collisions
+                      are resolved.
+                    - Default: pymunk's default (0.1)
+                - max_substeps: Int
+                    - The maximum number of substeps a physics step is
+                      split into when bodies move fast. 1 -> never split.
+                    - Default: substepping.MAX_SUBSTEPS
+                - substep_fraction: Float
+                    - The fraction of the thinnest shape's size that a body
+                      may move in one substep.
+                    - Default: substepping.SUBSTEP_FRACTION
+    '''
+
+    game.set_pipelined(settings.get('pipelined', False))
+    game.set_fixed_timestep(settings.get('fixed_timestep', True))
+    game.set_max_steps(settings.get('max_steps', timestep.MAX_STEPS))
+    space = game.get_space()
+    sleep_time = settings.get('sleep_time_threshold')
+    if sleep_time is not None:
+        space.sleep_time_threshold = sleep_time
+    space.idle_speed_threshold = settings.get('idle_speed_threshold', 0)
+
+    objects = game.get_moving_objects() + [game.get_player().get_object()]
+    broadphase.apply_broadphase(space, settings,
+                                [obj.get_shape() for obj in objects])
+
+    game.set_max_substeps(settings.get('max_substeps',
+                                       substepping.MAX_SUBSTEPS))
+    game.set_substep_fraction(settings.get('substep_fraction',
+                                           substepping.SUBSTEP_FRACTION))
+
+
 def load_pop_up_menu(file_name):
     '''
     Loads the pop-up menu defined in the YAML-file named "file_name".
@@ -281,13 +402,15 @@ def load_pop_up_menu(file_name):
             - The background of the menu.
     '''
 
-    # Get the full relative path of the YAML-file
-    base_dir = os.path.join('Data', 'menu_files')
-    fullname = os.path.join(base_dir, file_name)
+    # Load the YAML-file, from the asset archive if it's in it
+    with closing(assets.open_file('menu_files', file_name)) as stream:
+        text = stream.read()
+
+    # Decode the images of the menu in parallel before creating it
+    preload.preload_images(preload.find_images(
+        text, pygame.display.get_surface().get_size()))
 
-    # Load the YAML-file
-    with open(fullname, 'r') as stream:
-        item_dict = yaml.load(stream)
+    item_dict = yaml.load(text)
 
     # Create a background
     background_image_file = item_dict['background_file']
@@ -341,7 +464,7 @@ def load_pop_up_menu(file_name):
                            item, ', with key: ', key)
 
     # Create a Sprite group for the objects
-    obj_group = pygame.sprite.LayeredDirty(*objs)
+    obj_group = batching.BatchedDirty(*objs)
 
     # Blit background to screen, set mouse to visible
     background_rect = background.get_rect(center=pos)
@@ -355,9 +478,6 @@ def load_pop_up_menu(file_name):
     pygame.display.flip()
 
     # Start the music
-    # TODO: Find a way to not restart the music if the currently
-    #       playing file is to be loaded.
-    # TODO: Add smooth fading between songs.
     if music_file is not None:
         # Get the currently loaded song and whether it's playing
         current_song, playing = pygame.music_player.get_playing()
@@ -369,7 +489,8 @@ def load_pop_up_menu(file_name):
             # The right song is loaded, but not playing; start the song
             pygame.music_player.play()
         else:
-            # The wrong song is loaded; load the right one and start it
+            # The wrong song is loaded; load the right one in the
+            # background and fade over to it when it's ready
             pygame.music_player.load_and_play(music_file)
 
         pygame.music_player.set_volume(vol)
@@ -0,0 +1,92 @@
+# Build step that packs all files in Data/ into a single asset archive,
+# which the game then reads from instead of the loose files.
+# Run from the top directory of the game with
+#     python -m Tools.pack_assets [archive path]
+# and run it again whenever a file in Data/ has changed.
+
+import hashlib
+import json
+import os
+import sys
+
+from Tools import assets
+
+# Directories and files in Data/ that are not packed.
+SKIPPED_DIRS = ('cache',)
+SKIPPED_EXTENSIONS = ('.py', '.pyc', '.pyo', '.pak', '.tmp')
+
+
+def find_files(data_dir=assets.DATA_DIR):
+    '''
+    Returns a sorted list of the names of the files to pack, relative to
+    data_dir and with '/' as separator.
+    '''
+
+    names = []
+    for root, dirs, files in os.walk(data_dir):
+        dirs[:] = [name for name in dirs if name not in SKIPPED_DIRS]
+        for file_name in files:
+            if os.path.splitext(file_name)[1] in SKIPPED_EXTENSIONS:
+                continue
+            path = os.path.relpath(os.path.join(root, file_name), data_dir)
+            names.append(path.replace(os.sep, '/'))
+
+    return sorted(names)
+
+
+def pack(archive_path=assets.ARCHIVE_PATH, data_dir=assets.DATA_DIR):
+    '''
+    Packs the files in data_dir into an archive at archive_path.
+    See Tools/assets.py for the format of the archive.
+
+    Output:
+        * names: List of strings
+            - The names of the files that were packed.
+    '''
+
+    names = find_files(data_dir)
+    contents = []
+    for name in names:
+        with open(os.path.join(data_dir, *name.split('/')), 'rb') as stream:
+            contents.append(stream.read())
+
+    # The offsets depend on the length of the index, which depends on
+    # the offsets, so increase the assumed length until it fits
+    index_length = 0
+    while True:
+        offset = assets.HEADER.size + index_length
+        index = {}
+        for name, data in zip(names, contents):
+            index[name] = [offset, len(data),
+                           os.path.splitext(name)[1].lstrip('.').lower(),
+                           hashlib.sha1(data).hexdigest()]
+            offset += len(data)
+        index_data = json.dumps(index, sort_keys=True)
+        if len(index_data) <= index_length:
+            break
+        index_length = len(index_data)
+
+    # Write to a temporary file first, so a running game never
+    # sees half an archive
+    temp_path = archive_path + '.tmp'
+    with open(temp_path, 'wb') as stream:
+        stream.write(assets.HEADER.pack(assets.MAGIC, index_length))
+        stream.write(index_data.ljust(index_length))
+        for data in contents:
+            stream.write(data)
+    if os.path.exists(archive_path):
+        # NOTE: os.rename can't replace files on Windows
+        os.remove(archive_path)
+    os.rename(temp_path, archive_path)
+
+    return names
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+    else:
+        path = assets.ARCHIVE_PATH
+    packed = pack(path)
+    print 'Packed {count} files into "{path}"'.format(count=len(packed),
+                                                       path=path)
@@ -0,0 +1,188 @@
+# Prefetching of levels in the background while a menu is shown, so that
+# a level starts almost at once when its button is pressed.
+
+import heapq
+import threading
+from contextlib import closing
+
+import yaml
+
+from Tools import assets, preload
+
+# Priorities of prefetch requests; lower values are prefetched first.
+HOVER_PRIORITY = 0
+MENU_PRIORITY = 10
+
+
+class LevelPrefetcher():
+    '''
+    Parses level files and decodes their images on a background thread,
+    in order of priority. The parsed YAML node graph of each level is kept,
+    so that loading the level only has to create its objects.
+    '''
+
+    def __init__(self):
+        '''
+        Constructor for LevelPrefetcher.
+        '''
+
+        # Heap of (priority, order, file name); entries whose priority
+        # has since been raised are skipped when popped
+        self._queue = []
+        self._order = 0
+        # Maps file name -> best requested priority, for queued levels
+        self._queued = {}
+        # Maps file name -> parsed YAML node, for prefetched levels
+        self._done = {}
+        self._in_progress = None
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def request(self, file_name, priority=MENU_PRIORITY):
+        '''
+        Asks for the level in file_name to be prefetched. Asking again
+        with a lower priority value moves it forward in the queue.
+
+        Input:
+            * file_name: String
+                - The name of the YAML-file describing the level.
+            * priority: Int
+                - Lower values are prefetched first.
+                - Default: MENU_PRIORITY
+        '''
+
+        with self._condition:
+            if file_name in self._done or file_name == self._in_progress:
+                return
+            if self._queued.get(file_name, priority + 1) <= priority:
+                return
+
+            self._queued[file_name] = priority
+            self._order += 1
+            heapq.heappush(self._queue, (priority, self._order, file_name))
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                name='level prefetch')
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify()
+
+    def take(self, file_name):
+        '''
+        Returns the parsed YAML node of the level in file_name if it has
+        been prefetched, waiting for it if it's being prefetched right now.
+        Returns None if it hasn't been prefetched, in which case it's
+        taken out of the queue and should be loaded as usual.
+        '''
+
+        with self._condition:
+            while file_name == self._in_progress:
+                self._condition.wait()
+            self._queued.pop(file_name, None)
+            return self._done.get(file_name)
+
+    def forget(self, file_name=None):
+        '''
+        Throws away the prefetched node of the level in file_name, e.g. if
+        the file has changed. If file_name is None, all levels are forgotten.
+        '''
+
+        with self._condition:
+            if file_name is None:
+                self._done.clear()
+            else:
+                self._done.pop(file_name, None)
+
+    def _run(self):
+        '''
+        The loop of the prefetch thread.
+        '''
+
+        while True:
+            with self._condition:
+                file_name = self._next()
+                while file_name is None:
+                    self._condition.wait()
+                    file_name = self._next()
+                self._in_progress = file_name
+
+            try:
+                node = prefetch_level(file_name)
+            except Exception, message:
+                # The level is loaded as usual instead, which reports
+                # the error properly
+                print 'Cannot prefetch level:', file_name, message
+                node = None
+
+            with self._condition:
+                if node is not None:
+                    self._done[file_name] = node
+                self._in_progress = None
+                self._condition.notify_all()
+
+    def _next(self):
+        '''
+        Pops the queued level with the best priority, or returns None if
+        there is none. Must be called while holding the condition.
+        '''
+
+        while self._queue:
+            priority, order, file_name = heapq.heappop(self._queue)
+            if self._queued.get(file_name) == priority:
+                del self._queued[file_name]
+                return file_name
+
+        return None
+
+
+def prefetch_level(file_name):
+    '''
+    Parses the level in file_name into a YAML node graph, decodes its
+    images into view's image cache and loads its sound effects.
+
+    Output:
+        * node: yaml.Node
+            - The parsed level, which load_yaml.load_level can create
+              the level from.
+    '''
+
+    with closing(assets.open_file('level_files', file_name)) as stream:
+        node = yaml.compose(stream)
+
+    preload.preload_images(preload.find_images(node))
+    preload.preload_sounds(preload.find_sounds(node))
+
+    return node
+
+
+def get_level_file(button):
+    '''
+    Returns the name of the level file that button starts,
+    or None if it doesn't start a level.
+    '''
+
+    # Callbacks that start a level are marked with "starts_level"
+    if not getattr(button.get_action(), 'starts_level', False):
+        return None
+
+    args = button.get_action_args()
+    if not args:
+        return None
+    return args[0]
+
+
+def prefetch_buttons(buttons, priority=MENU_PRIORITY):
+    '''
+    Asks for the levels started by any of buttons to be prefetched,
+    in the order of the buttons.
+    '''
+
+    for index, button in enumerate(buttons):
+        file_name = get_level_file(button)
+        if file_name is not None:
+            level_prefetcher.request(file_name, priority + index)
+
+
+# The prefetcher shared by all menus
+level_prefetcher = LevelPrefetcher()
@@ -0,0 +1,240 @@
+# Decoding of the images and sound effects used by a level or menu in
+# parallel, before the objects that use them are created. The objects then
+# find their images in view's image cache and their sounds in the sound
+# bank instead of decoding them one by one.
+
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+
+import yaml
+
+from Graphics import view
+from Sound import sound_effects
+
+# The number of threads that decode images and sounds. None -> one per core.
+PRELOAD_THREADS = None
+
+# Keys whose values are names of image files.
+IMAGE_KEYS = ('image', 'background_file', 'hov_background_file')
+# Keys whose values are names of sound effect files.
+SOUND_KEYS = ('jump_sound_file', 'bounce_sound_file')
+
+# The pool of decoding threads, created when first needed
+_pool = None
+
+
+def find_images(stream, default_size=None):
+    '''
+    Finds the images used by a level or menu, and the sizes they will be
+    scaled to, without creating any objects.
+
+    Input:
+        * stream: String, file-like object or yaml.Node
+            - The YAML describing the level or menu, or its already
+              parsed node graph.
+        * default_size: 2-tuple of ints
+            - The size of background images whose size isn't given in
+              the file, like the backgrounds of menus.
+            - Default: None
+    Output:
+        * images: Dict
+            - Maps each image file name to a set of the sizes it will be
+              scaled to. None in the set means it is used unscaled, or
+              at a size that isn't known before the objects are created.
+    '''
+
+    images = {}
+    for node, values, default in _mappings(stream, default_size):
+        size = _scaled_size(node.tag, values) or default
+        for key, value in values.items():
+            if key in IMAGE_KEYS and isinstance(value, yaml.ScalarNode):
+                file_name = _scalar(value)
+                if file_name is not None:
+                    images.setdefault(file_name, set()).add(size)
+
+    return images
+
+
+def find_sounds(stream):
+    '''
+    Finds the sound effects used by a level, without creating any objects.
+
+    Input:
+        * stream: String, file-like object or yaml.Node
+            - The YAML describing the level, or its parsed node graph.
+    Output:
+        * sounds: Set of strings
+            - The names of the sound files.
+    '''
+
+    sounds = set()
+    for node, values, default in _mappings(stream):
+        for key, value in values.items():
+            if key in SOUND_KEYS and isinstance(value, yaml.ScalarNode):
+                file_name = _scalar(value)
+                if file_name is not None:
+                    sounds.add(file_name)
+
+    return sounds
+
+
+def preload_images(images):
+    '''
+    Decodes and scales images in parallel and stores them in view's
+    image cache.
+
+    Input:
+        * images: Dict
+            - Maps image file names to sets of sizes, as returned by
+              find_images().
+    '''
+
+    if not images:
+        return
+
+    # NOTE: pygame lets other threads run while it decodes and
+    #       scales images, so this runs on several cores at once.
+    _get_pool().map(_load, images.items())
+
+
+def preload_sounds(sounds):
+    '''
+    Decodes sound effects in parallel and stores them in the sound bank.
+
+    Input:
+        * sounds: Set of strings
+            - The names of the sound files, as returned by find_sounds().
+    '''
+
+    if not sounds:
+        return
+
+    _get_pool().map(sound_effects.bank.get_sound, sounds)
+
+
+def _get_pool():
+    '''
+    Returns the pool of decoding threads, creating it the first time.
+    '''
+
+    global _pool
+    if _pool is None:
+        _pool = ThreadPool(PRELOAD_THREADS or cpu_count())
+    return _pool
+
+
+def _load(item):
+    '''
+    Loads an image and its scaled versions into view's image cache.
+    Run on the decoding threads.
+    '''
+
+    file_name, sizes = item
+    try:
+        view.load_image(file_name)
+        for size in sizes:
+            if size is not None:
+                view.load_and_scale(file_name, size)
+    except SystemExit:
+        # Images that can't be loaded are reported when the objects
+        # that use them are created, on the main thread
+        pass
+
+
+def _mappings(stream, default_size=None):
+    '''
+    Goes through the mapping nodes of a YAML document, visiting each
+    node once. Yields the node, the values of its keys as returned by
+    _mapping_values(), and default_size for the root node, None otherwise.
+    '''
+
+    if isinstance(stream, yaml.Node):
+        root = stream
+    else:
+        root = yaml.compose(stream)
+    if root is None:
+        return
+
+    visited = set()
+    pending = [(root, default_size)]
+    while pending:
+        node, default = pending.pop()
+        if id(node) in visited:
+            continue
+        visited.add(id(node))
+
+        if isinstance(node, yaml.SequenceNode):
+            pending.extend((child, None) for child in node.value)
+            continue
+        if not isinstance(node, yaml.MappingNode):
+            continue
+
+        values = _mapping_values(node)
+        yield node, values, default
+        pending.extend((value, None) for value in values.values())
+
+
+def _mapping_values(node):
+    '''
+    Returns a dict mapping the keys of a YAML mapping node to their value
+    nodes, including the ones merged in with "<<".
+    '''
+
+    values = {}
+    for key_node, value_node in node.value:
+        key = key_node.value
+        if key == '<<':
+            if isinstance(value_node, yaml.SequenceNode):
+                merged = value_node.value
+            else:
+                merged = [value_node]
+            for merged_node in merged:
+                if isinstance(merged_node, yaml.MappingNode):
+                    for merged_key, merged_value in \
+                            _mapping_values(merged_node).items():
+                        values.setdefault(merged_key, merged_value)
+        else:
+            values[key] = value_node
+
+    return values
+
+
+def _scaled_size(tag, values):
+    '''
+    Returns the size the image of the object with the given YAML tag and
+    values will be scaled to, or None if it isn't known.
+    '''
+
+    try:
+        if tag in ('!Rectangle', '!Platform'):
+            return (int(_scalar(values['width'])),
+                    int(_scalar(values['height'])))
+        if tag == '!Circle':
+            radius = _scalar(values['radius'])
+            return (int(2*radius), int(2*radius))
+        for key in ('size', 'background_size'):
+            if key in values:
+                return tuple(int(_scalar(child))
+                             for child in values[key].value[:2])
+    except (KeyError, TypeError, ValueError, AttributeError):
+        pass
+
+    return None
+
+
+def _scalar(node):
+    '''
+    Returns the value of a YAML scalar node as an int, float,
+    None or string.
+    '''
+
+    value = node.value
+    if value in ('null', '~', ''):
+        return None
+    for convert in (int, float):
+        try:
+            return convert(value)
+        except ValueError:
+            pass
+
+    return value
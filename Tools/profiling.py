@@ -0,0 +1,235 @@
+# Timing of the different stages of each frame, to find out where the
+# time of slow frames goes. Timers are disabled by default and then
+# cost little more than a function call per stage.
+
+from __future__ import division
+
+from collections import deque
+from math import ceil
+from timeit import default_timer
+import csv
+import json
+
+# The default number of frames the timers remember.
+FRAME_HISTORY = 600
+# The percentiles that are reported for each stage.
+PERCENTILES = (50, 95, 99)
+
+
+class FrameTimer():
+    '''
+    Measures how long each stage of a frame takes. A frame is started with
+    begin_frame(), each stage is ended with mark(stage) and the frame is
+    ended with end_frame(). The time since the previous mark is counted
+    towards the stage being marked. The durations of the last frames are
+    kept in a ring buffer, from which percentiles can be computed.
+    '''
+
+    def __init__(self, history=FRAME_HISTORY, enabled=False):
+        '''
+        Constructor for FrameTimer.
+
+        Input:
+            * history: Int
+                - The number of frames to remember.
+                - Default: FRAME_HISTORY
+            * enabled: Bool
+                - Whether or not the timer should measure anything.
+                - Default: False
+        '''
+
+        self._enabled = enabled
+        # One dict per frame, mapping stage -> seconds
+        self._frames = deque(maxlen=history)
+        # The stages in the order they were first marked
+        self._stages = []
+        self._current = None
+        self._frame_start = 0
+        self._last = 0
+
+    def begin_frame(self):
+        '''
+        Starts timing a new frame.
+        '''
+
+        if not self._enabled:
+            return
+
+        self._current = {}
+        self._frame_start = self._last = default_timer()
+
+    def mark(self, stage):
+        '''
+        Ends the stage called stage, i.e. counts the time since the
+        previous mark (or the start of the frame) towards it.
+        Marking the same stage several times in a frame adds up the times.
+        '''
+
+        if not self._enabled or self._current is None:
+            return
+
+        now = default_timer()
+        current = self._current
+        current[stage] = current.get(stage, 0) + now - self._last
+        self._last = now
+
+    def end_frame(self):
+        '''
+        Ends the current frame and stores its timings.
+        Its total duration is stored as the stage "total".
+        '''
+
+        if not self._enabled or self._current is None:
+            return
+
+        current = self._current
+        current['total'] = default_timer() - self._frame_start
+        for stage in current:
+            if stage not in self._stages:
+                self._stages.append(stage)
+        self._frames.append(current)
+        self._current = None
+
+    def get_stats(self):
+        '''
+        Returns statistics about the remembered frames.
+
+        Output:
+            * stats: Dict
+                - Maps each stage to a dict with the number of frames it
+                  was marked in ("count"), the 50th, 95th and 99th
+                  percentile ("p50", "p95", "p99") and the maximum ("max")
+                  of its duration in milliseconds.
+        '''
+
+        stats = {}
+        for stage in self._stages:
+            times = sorted(frame[stage] * 1000 for frame in self._frames
+                           if stage in frame)
+            if not times:
+                continue
+            stage_stats = {'count': len(times), 'max': times[-1]}
+            for percentile in PERCENTILES:
+                stage_stats['p%d' % percentile] = \
+                    _percentile(times, percentile)
+            stats[stage] = stage_stats
+
+        return stats
+
+    def format_stats(self):
+        '''
+        Returns the statistics from get_stats() as a table in a string.
+        '''
+
+        columns = ['p%d' % percentile for percentile in PERCENTILES] + \
+            ['max']
+        lines = ['%-12s %6s' % ('stage (ms)', 'count') +
+                 ''.join(' %8s' % column for column in columns)]
+
+        stats = self.get_stats()
+        for stage in self._stages:
+            if stage not in stats:
+                continue
+            stage_stats = stats[stage]
+            lines.append('%-12s %6d' % (stage, stage_stats['count']) +
+                         ''.join(' %8.3f' % stage_stats[column]
+                                 for column in columns))
+
+        return '\n'.join(lines)
+
+    def get_frames(self):
+        '''
+        Returns a list of the remembered frames, oldest first, as dicts
+        mapping stage -> duration in milliseconds.
+        '''
+
+        return [dict((stage, seconds * 1000)
+                     for stage, seconds in frame.items())
+                for frame in self._frames]
+
+    def reset(self):
+        '''
+        Forgets all remembered frames.
+        '''
+
+        self._frames.clear()
+        self._stages = []
+        self._current = None
+
+    # Getters/setters
+
+    def get_enabled(self):
+        return self._enabled
+
+    def set_enabled(self, enabled):
+        self._enabled = enabled
+        if not enabled:
+            self._current = None
+
+    def get_stages(self):
+        return list(self._stages)
+
+
+def _percentile(sorted_values, percentile):
+    '''
+    Returns the given percentile (0-100) of a sorted, non-empty list,
+    using the nearest-rank method.
+    '''
+
+    rank = int(ceil(percentile / 100 * len(sorted_values))) - 1
+    return sorted_values[min(max(rank, 0), len(sorted_values) - 1)]
+
+
+# The timers of the game and menu loops
+timers = {'game': FrameTimer(),
+          'menu': FrameTimer()}
+game_timer = timers['game']
+menu_timer = timers['menu']
+
+
+def set_enabled(enabled):
+    '''
+    Enables or disables all timers.
+    '''
+
+    for timer in timers.values():
+        timer.set_enabled(enabled)
+
+
+def dump(file_name):
+    '''
+    Writes the timings of the remembered frames of all timers to a file.
+    If file_name ends with ".json", the statistics and frames of each
+    timer are written as JSON. Otherwise, a CSV-file is written with
+    one row per frame, with the name of the timer in the first column.
+
+    Input:
+        * file_name: String
+            - The path of the file to write.
+    '''
+
+    names = sorted(timers)
+
+    if file_name.lower().endswith('.json'):
+        data = dict((name, {'stats': timers[name].get_stats(),
+                            'frames': timers[name].get_frames()})
+                    for name in names)
+        with open(file_name, 'w') as stream:
+            json.dump(data, stream, indent=2, sort_keys=True)
+        return
+
+    stages = []
+    for name in names:
+        for stage in timers[name].get_stages():
+            if stage not in stages:
+                stages.append(stage)
+
+    # NOTE: Python 2's csv module wants files opened in binary mode
+    with open(file_name, 'wb') as stream:
+        writer = csv.writer(stream)
+        writer.writerow(['timer', 'frame'] + stages)
+        for name in names:
+            for index, frame in enumerate(timers[name].get_frames()):
+                writer.writerow([name, index] +
+                                ['%.4f' % frame[stage] if stage in frame
+                                 else '' for stage in stages])
@@ -16,6 +16,9 @@ def play_level(level_file_name):
 
     levels.run_level(level_file_name)
 
+# Lets menus find the levels their buttons start, to prefetch them
+play_level.starts_level = True
+
 
 def goto_menu(menu_file_name):
     '''
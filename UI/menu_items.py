@@ -1,7 +1,5 @@
 # Classes for objects in menus, such as buttons and text boxes.
 
-import os
-
 import pygame
 import yaml
 
@@ -119,20 +117,11 @@ class MenuItem(pygame.sprite.DirtySprite):
                 - The Rect correstponding to image
         '''
 
-        # Get the full path of the font file
-        if self._font_file is not None:
-            base_dir = os.path.join('Data', 'fonts')
-            font_file = os.path.join(base_dir, self._font_file)
-        else:
-            font_file = None
-
-        # Create a font object from the font file and size
-        font_obj = pygame.font.Font(font_file, self._font_size)
-
         # Get the individual lines of the text
         lines = self._text.split('\n')
-        # Render each line
-        rend_lines = [font_obj.render(line, True, self._text_color)
+        # Render each line (fonts and rendered lines are cached by view)
+        rend_lines = [view.render_text(self._font_file, self._font_size,
+                                       line, self._text_color)
                       for line in lines]
 
         # Get the width of the longest line
@@ -142,10 +131,12 @@ class MenuItem(pygame.sprite.DirtySprite):
 
         # Create a background
         if self._background_file is not None:
-            # Load the background image and scale to desired size
+            # Load the background image and scale to desired size.
+            # The loaded image is shared, so draw the text on a copy.
             image = view.load_and_scale(self._background_file,
                                         (int(tot_width * self._w_scale),
                                          int(tot_height * self._h_scale)))
+            image = image.copy()
         else:
             # Create a solid coloured rectangle of the desired size
             image = pygame.Surface((int(tot_width * self._w_scale),
@@ -3,7 +3,8 @@
 import pygame
 
 from GamePlay.gameclass import Game as Game
-from Tools import load_yaml
+from Tools import load_yaml, prefetch
+from Tools.profiling import menu_timer
 
 
 def run_menu(file_name):
@@ -18,6 +19,9 @@ def run_menu(file_name):
     # Load the menu
     buttons, obj_group, screen, background = load_yaml.load_menu(file_name)
 
+    # Start preparing the levels the buttons lead to in the background
+    prefetch.prefetch_buttons(buttons)
+
     # Create clock item
     clock = pygame.time.Clock()
     FPS = 60
@@ -27,6 +31,11 @@ def run_menu(file_name):
         pressed_button, open_pop_up = menu_loop(buttons, clock, FPS,
                                                 obj_group, screen)
 
+        # The level of a hovered button is likely to be played next
+        for button in buttons:
+            if button.get_hovered():
+                prefetch.prefetch_buttons([button], prefetch.HOVER_PRIORITY)
+
         if pressed_button is not None:
             return_val = pressed_button.perform_action()
             if return_val['exit']:
@@ -76,7 +85,10 @@ def menu_loop(buttons, clock, FPS, obj_group, screen):
     Takes input, checks if buttons have been pressed and redraws the screen.
     '''
 
+    menu_timer.begin_frame()
+
     mouse_pos, clicked, open_pop_up = Game.take_menu_input()
+    menu_timer.mark('input')
 
     pressed_button = None
 
@@ -89,13 +101,21 @@ def menu_loop(buttons, clock, FPS, obj_group, screen):
     else:
         for button in buttons:
             button.set_hovered(button.pressed(mouse_pos))
+    menu_timer.mark('buttons')
+
+    # Start music that has finished loading
+    pygame.music_player.update()
+    menu_timer.mark('music')
 
     # Keep the fps down
     clock.tick(FPS)
+    menu_timer.mark('tick')
 
     # Redraw the screen
     dirty_rects = obj_group.draw(screen)
     pygame.display.update(dirty_rects)
+    menu_timer.mark('draw')
+    menu_timer.end_frame()
 
     return pressed_button, open_pop_up
 
@@ -1,6 +1,8 @@
 # The main file, from which the game is started.
 
 from __future__ import division
+from optparse import OptionParser
+import os
 import traceback
 import sys
 
@@ -8,19 +10,90 @@ import pygame
 
 from Graphics import view
 from UI import menus
+from GamePlay import levels
+from Tools import profiling
+from Sound import sound_effects
 
 
-def main():
+def env_flag(name):
+    '''
+    Returns whether or not the environment variable named "name" is set
+    to a value that turns an option on, i.e. anything but nothing,
+    "0", "false", "no" or "off".
+    '''
+
+    value = os.environ.get(name, '').strip().lower()
+    return value not in ('', '0', 'false', 'no', 'off')
+
+
+def parse_args(args):
+    '''
+    Parses the command line arguments.
+
+    Output:
+        * options: optparse.Values
+            - The options given on the command line.
+    '''
+
+    parser = OptionParser()
+    parser.add_option('--headless', action='store_true',
+                      default=env_flag('TESTGAME_HEADLESS'),
+                      help='run without a display or sound card, using '
+                           'SDL\'s dummy drivers (also enabled by setting '
+                           'the TESTGAME_HEADLESS environment variable)')
+    parser.add_option('--level', default=None,
+                      help='start the given level file directly '
+                           'instead of the main menu')
+    parser.add_option('--frames', type='int', default=None,
+                      help='quit after running this many frames '
+                           'of the level')
+    parser.add_option('--no-fps-limit', action='store_false',
+                      dest='limit_fps', default=True,
+                      help='run the level as fast as possible')
+    parser.add_option('--profile', metavar='FILE', default=None,
+                      help='time the stages of each frame and write the '
+                           'timings to FILE on exit (JSON if FILE ends '
+                           'with .json, CSV otherwise)')
+
+    options, args = parser.parse_args(args)
+    return options
+
+
+def main(args=None):
     '''
     The main function of the game - everything starts here!
-    Initializes a window and loads the main menu.
+    Initializes a window and loads the main menu, or the level
+    given on the command line.
     '''
 
+    options = parse_args(args)
+
+    if options.profile is not None:
+        profiling.set_enabled(True)
+
     # Initialize a window
-    screen, background = view.init_window()
+    screen, background = view.init_window(headless=options.headless)
 
-    # Load the main menu
-    menus.run_menu('main_menu.yaml')
+    try:
+        if options.level is not None:
+            # Run the level directly
+            levels.run_level(options.level, frames=options.frames,
+                             limit_fps=options.limit_fps)
+        else:
+            # Load the main menu
+            menus.run_menu('main_menu.yaml')
+    finally:
+        # NOTE: Menus quit the game by calling sys.exit(), so the
+        #       timings are written here rather than after the calls.
+        if options.profile is not None:
+            profiling.dump(options.profile)
+            print profiling.game_timer.format_stats()
+            stats = sound_effects.effects.get_stats()
+            print ('Sound effects: {played} played, {merged} merged, '
+                   '{dropped} dropped').format(**stats)
+            stats = pygame.music_player.get_stats()
+            print ('Music: {switches} changes, longest hitch '
+                   '{max_hitch:.2f} ms').format(**stats)
 
 
 # Run the game and handle exceptions
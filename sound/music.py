@@ -1,37 +1,91 @@
-import os
+from __future__ import division
+from collections import OrderedDict
+import threading
+from timeit import default_timer
 
 import pygame
 
-# TODO: Add exception handling
+from Tools import assets
+from Sound import sound_effects
+
+# The time in milliseconds it takes to fade from one song to the next.
+CROSSFADE_TIME = 1000
+# The number of decoded songs kept in memory, so that switching back to
+# a recently played song doesn't have to decode it again.
+MAX_TRACKS = 3
 
 
 class Music():
     '''
-    A wrapper for pygame.mixer.music to be able to check which music file
-    is currently being played.
+    A music player that can check which music file is currently being played.
+
+    Songs are decoded into pygame.mixer.Sound objects on a background
+    thread, so that loading them never stalls a frame, and are played
+    on the mixer channels reserved for music (see sound_effects.py).
+    When the song changes, the old one fades out on one channel while
+    the new one fades in on the other. update() must be called once per
+    frame to start songs that have finished loading.
     '''
 
     def __init__(self):
         self._currently_loaded = None
+        # Whether or not the currently loaded song should be playing
+        self._wants_play = False
+        self._reps = -1
+        self._volume = 1.0
+        # Maps file name -> decoded pygame.mixer.Sound, least
+        # recently used first
+        self._tracks = OrderedDict()
+        # The song that is playing and the channel it is playing on
+        self._playing = None
+        self._channel = None
+        # The music channels, created when the mixer is first used
+        self._channels = None
+        # Songs are decoded on a background thread
+        self._lock = threading.Lock()
+        self._loading = set()
+        # Songs that couldn't be decoded since the last update()
+        self._failed = set()
+        # Statistics
+        self._switches = 0
+        self._last_hitch = 0.0
+        self._max_hitch = 0.0
+        self._load_times = {}
 
     def load(self, file_name):
         '''
-        Load the file named "file_name".
+        Load the file named "file_name". The file is decoded in the
+        background; the song starts when it is ready if play() is called.
 
         Input:
             * file_name: String
                 - The name of the file that is to be loaded.
         '''
 
-        base_dir = os.path.join('Data', 'sound')
-        full_name = os.path.join(base_dir, file_name)
+        start = default_timer()
+
+        if file_name != self._currently_loaded:
+            self._currently_loaded = file_name
+            self._wants_play = False
+
+        if pygame.mixer.get_init():
+            with self._lock:
+                start_thread = (file_name not in self._tracks and
+                                file_name not in self._loading)
+                if start_thread:
+                    self._loading.add(file_name)
+                    self._failed.discard(file_name)
+            if start_thread:
+                thread = threading.Thread(target=self._decode,
+                                          args=(file_name,))
+                thread.daemon = True
+                thread.start()
 
-        pygame.mixer.music.load(full_name)
-        self._currently_loaded = file_name
+        self._measure_hitch(start)
 
     def play(self, reps=-1):
         '''
-        Play the currently loaded file.
+        Play the currently loaded file, as soon as it has been decoded.
 
         Input:
             * reps: Int
@@ -41,7 +95,13 @@ class Music():
                 - Default: -1
         '''
 
-        pygame.mixer.music.play(reps)
+        self._wants_play = True
+        self._reps = reps
+        # Only restart the song if it has stopped
+        if self._playing == self._currently_loaded and \
+                self._channel is not None and not self._channel.get_busy():
+            self._playing = None
+        self.update()
 
     def set_volume(self, vol):
         '''
@@ -51,11 +111,22 @@ class Music():
             * vol: Float 0.0 - 1.0
                 - The volume to be set.
         '''
-        pygame.mixer.music.set_volume(vol)
+
+        self._volume = vol
+
+        # A song that is still being decoded gets the volume when it
+        # starts; the song fading out to it keeps its own
+        if self._playing != self._currently_loaded:
+            return
+        with self._lock:
+            sound = self._tracks.get(self._playing)
+        if sound is not None:
+            sound.set_volume(vol)
 
     def load_and_play(self, file_path, reps=-1):
         '''
-        Load the file found at "file_path" and start playing it.
+        Load the file found at "file_path" and start playing it,
+        fading out the song that is currently playing.
 
         Input:
             * file_path: String
@@ -70,6 +141,98 @@ class Music():
         self.load(file_path)
         self.play(reps)
 
+    def update(self):
+        '''
+        Starts the currently loaded song, crossfading from the song that is
+        playing, if it should play and has finished decoding.
+        Should be called once per frame.
+        '''
+
+        if not self._wants_play or self._playing == self._currently_loaded:
+            return
+        if not pygame.mixer.get_init():
+            return
+
+        with self._lock:
+            if self._currently_loaded in self._failed:
+                # Keep playing the old song. Forget the failed one, so
+                # that it is tried again the next time it's loaded.
+                self._failed.discard(self._currently_loaded)
+                self._currently_loaded = self._playing
+                return
+            sound = self._tracks.get(self._currently_loaded)
+            if sound is not None:
+                self._tracks[self._currently_loaded] = \
+                    self._tracks.pop(self._currently_loaded)
+        if sound is None:
+            # Still decoding
+            return
+
+        start = default_timer()
+
+        if self._channels is None:
+            sound_effects.reserve_channels()
+            self._channels = [pygame.mixer.Channel(index) for index
+                              in range(sound_effects.MUSIC_CHANNELS)]
+
+        # Fade out the old song on its channel and fade in the new one
+        # on the other
+        fade = CROSSFADE_TIME if self._playing is not None else 0
+        old_channel = self._channel
+        if old_channel is None or old_channel is self._channels[1]:
+            new_channel = self._channels[0]
+        else:
+            new_channel = self._channels[1]
+        if old_channel is not None:
+            if fade:
+                old_channel.fadeout(fade)
+            else:
+                old_channel.stop()
+        new_channel.stop()
+
+        sound.set_volume(self._volume)
+        new_channel.play(sound, self._reps, 0, fade)
+
+        self._playing = self._currently_loaded
+        self._channel = new_channel
+        self._switches += 1
+
+        self._measure_hitch(start)
+
+    def _decode(self, file_name):
+        '''
+        Decodes the music file named "file_name" into the track cache.
+        Run on a background thread.
+        '''
+
+        start = default_timer()
+        sound = None
+        try:
+            # Get the file, from the asset archive if it's in it
+            sound = pygame.mixer.Sound(assets.get_source('sound', file_name))
+        except (pygame.error, IOError), message:
+            print 'Pygame error: ', message
+            print 'Cannot load music:', file_name
+        finally:
+            with self._lock:
+                self._loading.discard(file_name)
+                if sound is not None:
+                    self._tracks[file_name] = sound
+                    while len(self._tracks) > MAX_TRACKS:
+                        self._tracks.popitem(last=False)
+                else:
+                    self._failed.add(file_name)
+                self._load_times[file_name] = default_timer() - start
+
+    def _measure_hitch(self, start):
+        '''
+        Records the time since start, spent on the main thread
+        on changing the music.
+        '''
+
+        self._last_hitch = default_timer() - start
+        self._max_hitch = max(self._max_hitch, self._last_hitch)
+
     def get_playing(self):
         '''
         Checks which song is currently loaded and whether it is playing.
@@ -78,6 +241,29 @@ class Music():
             * currently_loaded: String
                 - The path of the file that is currently loaded.
             * playing: Bool
-                - Whether or not the currently loaded file is playing.
+                - Whether or not the currently loaded file is playing,
+                  or will start playing once it has been decoded.
         '''
-        return self._currently_loaded, pygame.mixer.music.get_busy()
+
+        if not self._wants_play:
+            return self._currently_loaded, False
+        if self._playing != self._currently_loaded:
+            return self._currently_loaded, True
+        return (self._currently_loaded,
+                self._channel is not None and self._channel.get_busy())
+
+    def get_stats(self):
+        '''
+        Returns a dict with the number of song changes, the time in
+        milliseconds spent on the main thread by the last and the longest
+        song change, and the time in milliseconds it took to decode
+        each song.
+        '''
+
+        with self._lock:
+            load_times = dict((file_name, time * 1000) for file_name, time
+                              in self._load_times.items())
+        return {'switches': self._switches,
+                'last_hitch': self._last_hitch * 1000,
+                'max_hitch': self._max_hitch * 1000,
+                'load_times': load_times}
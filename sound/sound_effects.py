@@ -1,8 +1,35 @@
 # Functions for handling sound
 
-import os
+import threading
+
 import pygame
 
+from Tools import assets
+
+# The layout of the mixer's channels. The first ones are reserved for
+# crossfading music (see music.py), the next ones for sound effects.
+MUSIC_CHANNELS = 2
+EFFECT_CHANNELS = 8
+FIRST_EFFECT_CHANNEL = MUSIC_CHANNELS
+
+# The default minimum time in milliseconds between two plays of the same
+# sound effect, and the default maximum number of plays of the same sound
+# effect at once.
+COOLDOWN = 60
+MAX_VOICES = 2
+
+
+def reserve_channels():
+    '''
+    Makes sure the mixer has enough channels for music and sound effects,
+    and reserves them so that pygame doesn't pick them for other sounds.
+    '''
+
+    count = MUSIC_CHANNELS + EFFECT_CHANNELS
+    if pygame.mixer.get_num_channels() < count:
+        pygame.mixer.set_num_channels(count)
+    pygame.mixer.set_reserved(count)
+
 
 def load_sound(file_name):
     '''
@@ -17,14 +44,13 @@ def load_sound(file_name):
         print 'Warning: Unable to load module pygame.mixer'
         return DummySound()
 
-    # Get the full path to the sound file.
-    base_dir = os.path.join('Data', 'sound')
-    fullname = os.path.join(base_dir, file_name)
+    # Get the sound file, from the asset archive if it's in it.
+    source = assets.get_source('sound', file_name)
 
     # Try to load the sound file. If an error occurs, print the error
     # and return a dummy sound object.
     try:
-        sound = pygame.mixer.Sound(fullname)
+        sound = pygame.mixer.Sound(source)
     except pygame.error, message:
         print 'Pygame error: ', message
         print 'Cannot load sound:', file_name
@@ -32,6 +58,121 @@ def load_sound(file_name):
     return sound
 
 
+class SoundBank():
+    '''
+    Loads each sound effect once per process and hands out handles to it.
+    Objects that use the same sound file share one pygame.mixer.Sound,
+    each through its own SoundHandle with its own volume.
+    '''
+
+    def __init__(self):
+        '''
+        Constructor for SoundBank.
+        '''
+
+        # Maps file name -> pygame.mixer.Sound or DummySound
+        self._sounds = {}
+        # Sounds may be preloaded on the prefetching thread
+        self._lock = threading.Lock()
+        # Statistics
+        self._loads = 0
+        self._hits = 0
+
+    def get_sound(self, file_name):
+        '''
+        Returns the sound in the file named "file_name",
+        loading it if it hasn't been loaded before.
+        '''
+
+        with self._lock:
+            sound = self._sounds.get(file_name)
+            if sound is not None:
+                self._hits += 1
+                return sound
+
+        # Decode without holding the lock, so that several sounds can be
+        # decoded at once. If two threads load the same file, the sound
+        # that was stored first is used.
+        # NOTE: A sound that can't be loaded is stored as a dummy,
+        #       so that it isn't tried again.
+        sound = load_sound(file_name)
+        with self._lock:
+            self._loads += 1
+            return self._sounds.setdefault(file_name, sound)
+
+    def get_handle(self, file_name, volume=1.0):
+        '''
+        Returns a new SoundHandle to the sound in the file named "file_name".
+
+        Input:
+            * file_name: String
+                - The name of the sound file, in Data/sound.
+            * volume: Float
+                - The volume of the handle, in the interval 0.0-1.0.
+                - Default: 1.0
+        '''
+
+        return SoundHandle(self.get_sound(file_name), volume)
+
+    def clear(self):
+        '''
+        Forgets all loaded sounds.
+        '''
+
+        with self._lock:
+            self._sounds = {}
+
+    def get_stats(self):
+        '''
+        Returns a dict with the number of sounds loaded from file and the
+        number of times an already loaded sound was reused.
+        '''
+
+        with self._lock:
+            return {'loads': self._loads, 'hits': self._hits,
+                    'sounds': len(self._sounds)}
+
+
+class SoundHandle():
+    '''
+    One user's reference to a shared sound. Playing it goes through the
+    sound effect manager, at the handle's volume.
+    '''
+
+    def __init__(self, sound, volume=1.0):
+        '''
+        Constructor for SoundHandle.
+
+        Input:
+            * sound: pygame.mixer.Sound
+                - The shared sound, see SoundBank.
+            * volume: Float
+                - The volume to play the sound at, in the interval 0.0-1.0.
+                - Default: 1.0
+        '''
+
+        self._sound = sound
+        self._volume = volume
+
+    def play(self, level=1.0):
+        '''
+        Plays the sound at the handle's volume times level.
+        '''
+
+        effects.trigger(self._sound, self._volume * level)
+
+    # Getters/setters
+
+    def get_sound(self):
+        return self._sound
+
+    def get_volume(self):
+        return self._volume
+
+    def set_volume(self, volume):
+        self._volume = volume
+
+
 class DummySound:
     '''
     A dummy sound object, is returned if a real sound couldn't be loaded.
@@ -42,3 +183,163 @@ class DummySound:
 
     def set_volume(self, level):
         pass
+
+
+class SoundEffectManager():
+    '''
+    Plays sound effects on a fixed pool of reserved mixer channels, so that
+    effects never take channels from music or from each other without
+    limit. Sounds are triggered with trigger() and played when update()
+    is called, once per frame. All triggers of a sound between two updates
+    are merged into a single play at the highest volume. Triggers during a
+    sound's cooldown, or when it already plays on too many channels or
+    no channel is free, are dropped.
+    '''
+
+    def __init__(self, first_channel=FIRST_EFFECT_CHANNEL,
+                 channel_count=EFFECT_CHANNELS):
+        '''
+        Constructor for SoundEffectManager.
+
+        Input:
+            * first_channel: Int
+                - The number of the first mixer channel of the pool.
+                - Default: FIRST_EFFECT_CHANNEL
+            * channel_count: Int
+                - The number of channels in the pool.
+                - Default: EFFECT_CHANNELS
+        '''
+
+        self._first_channel = first_channel
+        self._channel_count = channel_count
+        # The channels of the pool, created when the mixer is first used
+        self._channels = None
+        # Maps sound -> (cooldown, max voices), for sounds
+        # that don't use the defaults
+        self._limits = {}
+        # Maps sound -> the time it was last played, in milliseconds
+        self._last_played = {}
+        # Maps sound -> highest volume it has been triggered at
+        # since the last update
+        self._pending = {}
+        # Sounds may be triggered from the physics thread
+        self._lock = threading.Lock()
+        # Statistics
+        self._stats = {'triggered': 0, 'played': 0, 'merged': 0,
+                       'dropped_cooldown': 0, 'dropped_voices': 0,
+                       'dropped_no_channel': 0}
+
+    def trigger(self, sound, volume=1.0):
+        '''
+        Asks for sound to be played at the next update().
+
+        Input:
+            * sound: pygame.mixer.Sound
+                - The sound to play.
+            * volume: Float
+                - The volume to play it at, 0.0 - 1.0, on top of the
+                  sound's own volume.
+                - Default: 1.0
+        '''
+
+        # Sounds that couldn't be loaded are dummies, which can't be
+        # played on a channel
+        if isinstance(sound, DummySound):
+            return
+
+        with self._lock:
+            self._stats['triggered'] += 1
+            if sound in self._pending:
+                self._stats['merged'] += 1
+                volume = max(volume, self._pending[sound])
+            self._pending[sound] = volume
+
+    def update(self):
+        '''
+        Plays the sounds that have been triggered since the last call.
+        Should be called once per frame.
+        '''
+
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+
+        if not pending or not pygame.mixer.get_init():
+            return
+
+        if self._channels is None:
+            self._create_channels()
+
+        now = pygame.time.get_ticks()
+        for sound, volume in pending.items():
+            cooldown, max_voices = self._limits.get(sound,
+                                                    (COOLDOWN, MAX_VOICES))
+
+            if now - self._last_played.get(sound, -cooldown) < cooldown:
+                self._stats['dropped_cooldown'] += 1
+                continue
+
+            voices = 0
+            free = None
+            for channel in self._channels:
+                if channel.get_busy():
+                    if channel.get_sound() is sound:
+                        voices += 1
+                elif free is None:
+                    free = channel
+
+            if voices >= max_voices:
+                self._stats['dropped_voices'] += 1
+                continue
+            if free is None:
+                self._stats['dropped_no_channel'] += 1
+                continue
+
+            free.play(sound)
+            # NOTE: Set after playing, since playing may reset the volume
+            free.set_volume(min(max(volume, 0.0), 1.0))
+            self._last_played[sound] = now
+            self._stats['played'] += 1
+
+    def _create_channels(self):
+        '''
+        Reserves the mixer's music and effect channels
+        and creates the pool.
+        '''
+
+        reserve_channels()
+        last = self._first_channel + self._channel_count
+        if pygame.mixer.get_num_channels() < last:
+            pygame.mixer.set_num_channels(last)
+        self._channels = [pygame.mixer.Channel(index) for index
+                          in range(self._first_channel, last)]
+
+    def set_limits(self, sound, cooldown=COOLDOWN, max_voices=MAX_VOICES):
+        '''
+        Sets the cooldown, in milliseconds, and the maximum number of
+        voices for sound.
+        '''
+
+        self._limits[sound] = (cooldown, max_voices)
+
+    def get_stats(self):
+        '''
+        Returns a dict with the number of sounds triggered, played and
+        merged into other triggers, and the number dropped because of
+        cooldown ("dropped_cooldown"), too many voices ("dropped_voices")
+        or no free channel ("dropped_no_channel"), and in total ("dropped").
+        '''
+
+        with self._lock:
+            stats = dict(self._stats)
+        stats['dropped'] = (stats['dropped_cooldown'] +
+                            stats['dropped_voices'] +
+                            stats['dropped_no_channel'])
+        return stats
+
+
+# The manager that plays all sound effects in the game
+effects = SoundEffectManager()
+
+# The sound effects loaded so far
+bank = SoundBank()
@@ -0,0 +1,123 @@
+# Tests for Graphics/cameras.py. Run from the root of the repository:
+#     python -m unittest discover tests
+
+from __future__ import division
+import os
+import unittest
+
+import pygame
+
+from Graphics.backgrounds import TiledBackground
+from Graphics.cameras import Camera, CLEAR_COLOR
+
+SCREEN_SIZE = (600, 480)
+# The size of the world in level_1.yaml
+WORLD_SIZE = (1000, 600)
+
+
+class FakeGame():
+    '''
+    Stands in for a Game with a player drawn at a fixed screen position.
+    '''
+
+    def __init__(self, player_center):
+        self._object = pygame.sprite.Sprite()
+        self._object.rect = pygame.Rect(0, 0, 20, 20)
+        self._object.rect.center = player_center
+
+    def get_player(self):
+        return self
+
+    def get_object(self):
+        return self._object
+
+
+class CameraZoomTest(unittest.TestCase):
+
+    def setUp(self):
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+        pygame.display.init()
+        pygame.display.set_mode(SCREEN_SIZE, 0, 32)
+
+    def tearDown(self):
+        pygame.display.quit()
+
+    def assert_inside_world(self, camera):
+        for axis in range(2):
+            world = WORLD_SIZE[axis] * camera.get_scale()
+            self.assertGreaterEqual(camera._pos[axis], 0)
+            self.assertLessEqual(camera._pos[axis] + SCREEN_SIZE[axis],
+                                 world)
+
+    def test_zoom_in_at_world_edge(self):
+        # Near the bottom edge of the world, following a player at the
+        # bottom of the screen
+        camera = Camera(pos=(200, WORLD_SIZE[1] - SCREEN_SIZE[1]),
+                        world_size=WORLD_SIZE, margin=150)
+        game = FakeGame((SCREEN_SIZE[0] / 2, SCREEN_SIZE[1] - 10))
+
+        camera.set_zoom(1.5)
+        self.assertGreater(camera.get_scale(), 1)
+        self.assert_inside_world(camera)
+
+        for frame in range(10):
+            camera._follow_player(game)
+            self.assert_inside_world(camera)
+
+    def test_zoom_out_at_world_edge(self):
+        camera = Camera(pos=(WORLD_SIZE[0] - SCREEN_SIZE[0],
+                             WORLD_SIZE[1] - SCREEN_SIZE[1]),
+                        world_size=WORLD_SIZE)
+
+        camera.zoom_out()
+        self.assertLess(camera.get_scale(), 1)
+        self.assert_inside_world(camera)
+
+    def test_zoom_out_centers_small_world(self):
+        camera = Camera(pos=(100, 50), world_size=WORLD_SIZE)
+
+        camera.set_zoom(0.5)
+        for axis in range(2):
+            world = WORLD_SIZE[axis] * camera.get_scale()
+            self.assertLess(world, SCREEN_SIZE[axis])
+            self.assertAlmostEqual(camera._pos[axis],
+                                   (world - SCREEN_SIZE[axis]) / 2)
+
+
+
+class CameraDirtyDrawTest(unittest.TestCase):
+
+    def setUp(self):
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+        pygame.display.init()
+        pygame.display.set_mode(SCREEN_SIZE, 0, 32)
+
+    def tearDown(self):
+        pygame.display.quit()
+
+    def test_sprite_leaves_no_trail_outside_world(self):
+        # A world smaller than the screen, so it is centered with
+        # empty space around it
+        world_size = (300, 200)
+        camera = Camera(world_size=world_size, render_mode='dirty')
+        camera._clamp_position()
+        background = TiledBackground.from_color((0, 0, 255), world_size)
+        screen = pygame.display.get_surface()
+
+        sprite = pygame.sprite.DirtySprite()
+        sprite.image = pygame.Surface((20, 20))
+        sprite.image.fill((255, 0, 0))
+        sprite.rect = sprite.image.get_rect(topleft=(10, 10))
+        camera._draw_full(screen, background, [sprite])
+
+        # Move the sprite away from the empty space in the corner
+        sprite.rect.topleft = (300, 240)
+        sprite.dirty = 1
+        camera._draw_dirty(screen, background, [sprite])
+
+        self.assertEqual(tuple(screen.get_at((15, 15)))[:3], CLEAR_COLOR)
+        self.assertEqual(tuple(screen.get_at((305, 245)))[:3], (255, 0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+# Tests for Physics/collision_callbacks.py. Run from the root of the
+# repository:
+#     python -m unittest discover tests
+
+from __future__ import division
+import unittest
+
+import pymunk
+
+from Physics import collision_callbacks as col_call
+from Physics.collision_events import CollisionEvents
+
+STEP = 1 / 60
+
+
+class FakePlayer():
+    '''
+    Stands in for a Player, recording its ground contacts.
+    '''
+
+    def __init__(self):
+        self.ground_contacts = set()
+
+    def add_ground_contact(self, obj):
+        self.ground_contacts.add(obj)
+
+    def remove_ground_contact(self, obj):
+        self.ground_contacts.discard(obj)
+
+    def play_bounce(self, level):
+        pass
+
+
+class GroundContactTest(unittest.TestCase):
+
+    def setUp(self):
+        self.space = pymunk.Space()
+        self.events = CollisionEvents()
+        self.events.watch(self.space, col_call.PLAYER_TYPE,
+                          col_call.STATIC_TYPE, col_call.player_static)
+        self.player = FakePlayer()
+
+    def add_box(self, left, bottom, right, top):
+        box = pymunk.Poly(self.space.static_body,
+                          [(left, bottom), (left, top),
+                           (right, top), (right, bottom)])
+        box.friction = 1.0
+        box.collision_type = col_call.STATIC_TYPE
+        self.space.add(box)
+        self.events.register(box, box)
+
+    def add_player(self, pos):
+        body = pymunk.Body(1, pymunk.moment_for_circle(1, 0, 10))
+        body.position = pos
+        shape = pymunk.Circle(body, 10)
+        shape.friction = 1.0
+        shape.collision_type = col_call.PLAYER_TYPE
+        self.space.add(body, shape)
+        self.events.register(shape, self.player)
+        return body
+
+    def step(self, steps, push=(0, 0)):
+        for i in range(steps):
+            self.body.apply_impulse(push)
+            self.space.step(STEP)
+            self.events.collect_impulses()
+            self.events.dispatch()
+
+    def test_corner_landing(self):
+        # The player starts against the top right corner of a box, lower
+        # than its top, and is pushed over the corner onto the top
+        self.space.gravity = (0, -900)
+        self.add_box(-900, 0, 100, 100)
+        self.body = self.add_player((109, 104.5))
+
+        self.step(20, push=(-40, 0))
+        self.step(100)
+
+        # The contact began against the side, so it wasn't recorded as
+        # ground, but the player now rests on top of the box
+        self.assertEqual(self.player.ground_contacts, set())
+        self.assertGreater(self.body.position.y, 100)
+        self.assertTrue(col_call.touches_ground(self.body))
+
+    def test_wall_is_not_ground(self):
+        # Without gravity, the player is pushed against the side of a box
+        self.add_box(0, 0, 100, 100)
+        self.body = self.add_player((115, 50))
+
+        self.step(30, push=(-10, 0))
+
+        self.assertEqual(self.player.ground_contacts, set())
+        self.assertFalse(col_call.touches_ground(self.body))
+
+    def test_landing_on_top(self):
+        self.space.gravity = (0, -900)
+        self.add_box(0, 0, 100, 100)
+        self.body = self.add_player((50, 150))
+
+        self.step(60)
+
+        self.assertEqual(len(self.player.ground_contacts), 1)
+        self.assertTrue(col_call.touches_ground(self.body))
+
+
+if __name__ == '__main__':
+    unittest.main()